@@ -1,78 +1,65 @@
 import os
 import json
-import pandas as pd
 import numpy as np
-import pickle
-import pika
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
 import logging
-import random
-import time
+import warnings
 from .dictionary import QueueName, Action
+from .modelRegistry import ModelRegistry
+from .microBatcher import MicroBatcher
+from .predictionCache import PredictionCache
+from .featureEncoder import parse_size
+from .publisher import get_publisher
+from .consumer import Consumer, consumer_settings
+from .messageCodec import decode
+from .trainingJobs import TrainingJobManager
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+# Older artifacts were fitted on a DataFrame, inference now passes plain float32 rows
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
 
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
 load_dotenv(dotenv_path=dotenv_path)
 app = Flask(__name__)
 CORS(app, origins=["http://localhost:3000", "http://localhost:6543"])
 RABBITMQ_HOST = os.getenv('RABBITMQ_HOST', 'rabbitmq')
+model_registry = ModelRegistry()
+training_jobs = TrainingJobManager(model_registry)
 
-def load_model(model_path=None):
-    """Load a trained model from file"""
-    try:
-        if model_path is None:
-            model_path = os.path.join(os.path.dirname(__file__), 'trained_model.pkl')
-        with open(model_path, 'rb') as f:
-            model_data = pickle.load(f)
-            return model_data['model'], model_data['feature_columns']
-    except Exception as e:
-        print(f"Error loading model: {e}")
-        return None, None
+def publish_to_uploader(message):
+    """Publish a message to the uploader queue via the shared RabbitMQ publisher"""
+    # Never waits: with the broker down, predictions past the publisher's cap are dropped, not queued
+    if get_publisher().publish(QueueName.UPLOAD.value, message):
+        print("[DEBUG] Prediction queued for uploader")
 
 def send_to_uploader(prediction_data):
     """Send prediction to uploader via RabbitMQ"""
-    for _ in range(10):
-        try:
-            print("\n[DEBUG] Attempting to send prediction to uploader...")
-            connection = pika.BlockingConnection(
-                pika.ConnectionParameters(
-                    host=RABBITMQ_HOST,
-                    heartbeat=600,
-                    blocked_connection_timeout=300
-                )
-            )
-            channel = connection.channel()
-
-            message = {
-                'action': Action.AIMODEL_UPLOADER_UPLOAD_PREDICTION.value,
-                'prediction_data': prediction_data,
-            }
-
-            channel.basic_publish(
-                exchange='',
-                routing_key=QueueName.UPLOAD.value,
-                body=json.dumps(message)
-            )
-            
-            print("[DEBUG] Prediction sent to uploader queue successfully")
-            connection.close()
-
-        except Exception as e:
-            print(f"[DEBUG] Error sending prediction to uploader: {e}")
+    publish_to_uploader({
+        'action': Action.AIMODEL_UPLOADER_UPLOAD_PREDICTION.value,
+        'prediction_data': prediction_data,
+    })
+
+def send_batch_to_uploader(predictions):
+    """Send a whole batch of predictions to uploader as one message"""
+    publish_to_uploader({
+        'action': Action.AIMODEL_UPLOADER_UPLOAD_PREDICTION_BATCH.value,
+        'predictions': predictions,
+    })
 
 def process_message(ch, method, properties, body):
     """Process received message from RabbitMQ"""
     try:
-        message = json.loads(body)
+        message = decode(body)
         action = message.get('action')
 
         print(f"[DEBUG] Received message - Action: {action}")
         if action == Action.PROCESSOR_AIMODEL_TRAIN_MODEL.value:
-             print("[DEBUG] Received training message, but aimodel service does not perform training.")
+            # Runs in the training pool, the model registry swaps the new artifact in when it is published
+            job = training_jobs.submit(message.get('file_path'), trigger='rabbitmq')
+            print(f"[DEBUG] Training job {job['id']} is {job['state']}")
         else:
             print(f"[DEBUG] Unknown action: {action}")
 
@@ -84,29 +71,11 @@ def process_message(ch, method, properties, body):
 
 def start_listening():
     """Start listening for messages from RabbitMQ"""
-    for _ in range(10):
-        try:
-            print("Starting RabbitMQ listener...")
-            connection = pika.BlockingConnection(
-                pika.ConnectionParameters(
-                    host=RABBITMQ_HOST,
-                    heartbeat=600,
-                    blocked_connection_timeout=300
-                )
-            )
-            channel = connection.channel()
-
-            channel.basic_consume(
-                queue=QueueName.AI_MODEL.value,
-                on_message_callback=process_message
-            )
-
-            print("Waiting for messages...")
-            channel.start_consuming()
-
-        except Exception as e:
-            print(f"Error starting RabbitMQ listener: {e}")
-            raise
+    print("Starting RabbitMQ listener...")
+    Consumer(
+        QueueName.AI_MODEL.value, process_message, name='aimodel', host=RABBITMQ_HOST,
+        **consumer_settings('AIMODEL')
+    ).run()
 
 @app.route('/', methods=['GET', 'POST'])
 def root():
@@ -114,10 +83,122 @@ def root():
     return jsonify({
         "status": "API is running",
         "endpoints": {
-            "/predict": "POST - Get predictions for app metrics"
+            "/predict": "POST - Get predictions for app metrics",
+            "/predict/batch": "POST - Predictions for a JSON array or NDJSON stream of inputs",
+            "/model": "GET - Version and load time of the serving model",
+            "/metrics": "GET - Serving metrics",
+            "/train": "POST - Queue a training run on a cleaned dataset, optionally with a model backend",
+            "/train/status": "GET - Progress of queued, running and recent training jobs"
         }
     }), 200
 
+@app.route('/model', methods=['GET'])
+def model_status():
+    """Report the version and load time of the model currently being served"""
+    return jsonify(model_registry.status()), 200
+
+@app.route('/train', methods=['POST'])
+def train():
+    """Queue a background training run; duplicate requests join the job already waiting"""
+    data = request.get_json(silent=True) or {}
+    data_path = data.get('data_path')
+    if not data_path:
+        return jsonify({"error": "data_path is required"}), 400
+    try:
+        job = training_jobs.submit(data_path, trigger='api', backend=data.get('backend'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(job), 202
+
+@app.route('/train/status', methods=['GET'])
+def train_status():
+    """Report the stage and progress of training jobs"""
+    return jsonify(training_jobs.status()), 200
+
+@app.route('/train/status/<job_id>', methods=['GET'])
+def train_job_status(job_id):
+    job = training_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown training job"}), 404
+    return jsonify(job), 200
+
+REQUIRED_FIELDS = ['category', 'app_size', 'app_type', 'price', 'content_rating', 'genres']
+PREDICT_BATCH_MAX_ROWS = int(os.getenv('PREDICT_BATCH_MAX_ROWS', 10000))
+
+def predict_matrix(loaded, features):
+    """Run the model on an encoded feature matrix and clip Rating to the valid range"""
+    predictions = loaded.predict(features)
+    predictions[:, 0] = np.clip(predictions[:, 0], 1.0, 5.0)
+    return predictions
+
+# Optional serving mode that coalesces concurrent /predict calls into one model.predict
+PREDICT_MICROBATCH = os.getenv('PREDICT_MICROBATCH', 'false').lower() in ('1', 'true', 'yes')
+micro_batcher = MicroBatcher(
+    predict_matrix,
+    max_batch_size=int(os.getenv('PREDICT_MICROBATCH_MAX_SIZE', 64)),
+    max_wait_ms=float(os.getenv('PREDICT_MICROBATCH_MAX_WAIT_MS', 5))
+)
+
+prediction_cache = PredictionCache(
+    max_size=int(os.getenv('PREDICT_CACHE_SIZE', 10000)),
+    ttl=float(os.getenv('PREDICT_CACHE_TTL', 0))
+)
+
+def table_prediction(loaded, input_data):
+    """Answer from the precomputed lookup table, or None when the input is off the grid"""
+    if loaded.table is None:
+        return None
+    size = parse_size(input_data['app_size'], loaded.encoder.size_fill)
+    prediction = loaded.table.lookup(loaded.encoder.category_indices(input_data), size, float(input_data['price']))
+    if prediction is not None:
+        prediction[0] = np.clip(prediction[0], 1.0, 5.0)
+    return prediction
+
+def predict_row(loaded, features):
+    """Predict a single encoded row, through the micro-batcher when enabled"""
+    if PREDICT_MICROBATCH:
+        return micro_batcher.submit(loaded, features)
+    return predict_matrix(loaded, features.reshape(1, -1))[0]
+
+def build_result(input_data, prediction):
+    return {
+        'Input Features': input_data,
+        'Predictions': {
+            'Rating': float(prediction[0]),
+            'Installs': int(prediction[1]),
+            'Reviews': int(prediction[2])
+        }
+    }
+
+def read_batch_inputs():
+    """Read batch inputs from a JSON array or an NDJSON request body"""
+    if request.is_json:
+        inputs = request.get_json()
+        if not isinstance(inputs, list):
+            raise ValueError("Batch request must be a JSON array")
+        return inputs
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        inputs = []
+        for line_number, line in enumerate(request.stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                inputs.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON on line {line_number}: {e}")
+        return inputs
+    raise ValueError("Request must be a JSON array or NDJSON")
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose serving metrics such as micro-batch size and queue wait histograms"""
+    return jsonify({
+        'microbatch': dict(micro_batcher.metrics(), enabled=PREDICT_MICROBATCH),
+        'cache': prediction_cache.stats(),
+        'publisher': get_publisher().stats(),
+    }), 200
+
 @app.route('/predict', methods=['POST'])
 def predictAndSend():
     try:
@@ -127,39 +208,26 @@ def predictAndSend():
         input_data = request.get_json()
         logging.info(f"Received input data: {input_data}")
         
-        model, feature_columns = load_model()
-        if model is None:
+        loaded = model_registry.get()
+        if loaded is None:
             return jsonify({"error": "Model not found"}), 500
         
-        required_fields = ['category', 'app_size', 'app_type', 'price', 'content_rating', 'genres']
-        if not all(field in input_data for field in required_fields):
+        if not all(field in input_data for field in REQUIRED_FIELDS):
             return jsonify({"error": "Missing required fields"}), 400
 
-        df = pd.DataFrame([{
-            'Category': input_data['category'],
-            'Size': input_data['app_size'],
-            'Type': input_data['app_type'],
-            'Price': float(input_data['price']),
-            'Content Rating': input_data['content_rating'],
-            'Genres': input_data['genres']
-        }])
-
-        df_encoded = pd.get_dummies(df, columns=['Category', 'Type', 'Content Rating', 'Genres'])
-        final_df = pd.DataFrame(0, index=df_encoded.index, columns=feature_columns)
-        common_cols = df_encoded.columns.intersection(feature_columns)
-        final_df[common_cols] = df_encoded[common_cols]
-
-        predictions = model.predict(final_df)
-        predictions[0][0] = np.clip(predictions[0][0], 1.0, 5.0)
-
-        result = {
-            'Input Features': input_data,
-            'Predictions': {
-                'Rating': float(predictions[0][0]),
-                'Installs': int(predictions[0][1]),
-                'Reviews': int(predictions[0][2])
-            }
-        }
+        try:
+            cache_key = loaded.encoder.canonical_key(input_data)
+            prediction = table_prediction(loaded, input_data)
+            if prediction is None:
+                prediction = prediction_cache.get(loaded.version, cache_key)
+            features = loaded.encoder.encode(input_data) if prediction is None else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if prediction is None:
+            prediction = predict_row(loaded, features)
+            prediction_cache.put(loaded.version, cache_key, prediction)
+        result = build_result(input_data, prediction)
 
         send_to_uploader(result)
         return jsonify(result)
@@ -168,10 +236,61 @@ def predictAndSend():
         logging.error(f"Prediction error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/predict/batch', methods=['POST'])
+def predictBatchAndSend():
+    try:
+        try:
+            inputs = read_batch_inputs()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        logging.info(f"Received batch of {len(inputs)} inputs")
+        if not inputs:
+            return jsonify({"count": 0, "results": []})
+        if len(inputs) > PREDICT_BATCH_MAX_ROWS:
+            return jsonify({"error": f"Batch exceeds {PREDICT_BATCH_MAX_ROWS} rows"}), 413
+
+        for index, input_data in enumerate(inputs):
+            if not isinstance(input_data, dict) or not all(field in input_data for field in REQUIRED_FIELDS):
+                return jsonify({"error": f"Missing required fields in item {index}"}), 400
+
+        loaded = model_registry.get()
+        if loaded is None:
+            return jsonify({"error": "Model not found"}), 500
+
+        try:
+            cache_keys = [loaded.encoder.canonical_key(input_data) for input_data in inputs]
+            predictions = [table_prediction(loaded, input_data) for input_data in inputs]
+            predictions = [
+                prediction_cache.get(loaded.version, key) if prediction is None else prediction
+                for key, prediction in zip(cache_keys, predictions)
+            ]
+            missing = [index for index, prediction in enumerate(predictions) if prediction is None]
+            features = loaded.encoder.encode_batch([inputs[index] for index in missing]) if missing else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if missing:
+            for index, prediction in zip(missing, predict_matrix(loaded, features)):
+                predictions[index] = prediction
+                prediction_cache.put(loaded.version, cache_keys[index], prediction)
+        results = [build_result(input_data, prediction) for input_data, prediction in zip(inputs, predictions)]
+
+        send_batch_to_uploader(results)
+        return jsonify({"count": len(results), "results": results})
+
+    except Exception as e:
+        logging.error(f"Batch prediction error: {e}")
+        return jsonify({"error": str(e)}), 500
+
 
 if __name__ == "__main__":
     from threading import Thread
     flask_api_port = int(os.getenv('FLASK_API_PORT', 5000))
     logging.info(f"Starting Flask API server on port {flask_api_port}...")
+    model_registry.start()
+    get_publisher().start()
+    if PREDICT_MICROBATCH:
+        micro_batcher.start()
     Thread(target=start_listening).start()
     app.run(debug=True, port=flask_api_port, host='0.0.0.0') 
\ No newline at end of file
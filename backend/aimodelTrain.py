@@ -2,48 +2,255 @@ import os
 import pandas as pd
 import numpy as np
 import pickle
+import json
+import tempfile
+from datetime import datetime
+from scipy import sparse
 from sklearn.model_selection import train_test_split
-from sklearn.multioutput import MultiOutputRegressor
-from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import MultiLabelBinarizer
 import argparse
+from .featureEncoder import FeatureEncoder, MULTI_HOT_FEATURES, parse_genres
+from .columnarStore import read_dataset
+from .forestCompiler import compile_forest
+from .modelBackends import BACKENDS, backend_name, build_estimator
+from .featureStore import FeatureStore, EncodedDataset, FEATURE_STORE_ENABLED
+from .predictionTable import (
+    PredictionTable, table_path, observed_combinations, all_combinations, build_prediction_table,
+    save_prediction_table, interpolation_error
+)
 
 #python -m backend.aimodelTrain --data_path path\\to\\cleaned_dataset.csv
 
+TRAINING_COLUMNS = ['Category', 'Size', 'Type', 'Price', 'Content Rating', 'Genres', 'Rating', 'Installs', 'Reviews']
+TARGET_COLUMNS = ['Rating', 'Installs', 'Reviews']
+# A new artifact is rejected if its holdout MAE on any target exceeds the published model's by this factor
+MAX_HOLDOUT_MAE_REGRESSION = float(os.getenv('MAX_HOLDOUT_MAE_REGRESSION', 1.25))
+# A lookup table is only published if, on 95% of the training rows it covers, its interpolated
+# answers are within this relative error of the model on every target
+LOOKUP_TABLE_MAX_ERROR = float(os.getenv('LOOKUP_TABLE_MAX_ERROR', 0.05))
+# sklearn's sparse tree splitter is slower than its dense one, so the training split is densified
+# for fit() while it stays under this size; past it the forest is fitted on the CSR matrix itself
+FIT_DENSE_MAX_BYTES = int(os.getenv('FIT_DENSE_MAX_BYTES', 256 * 1024 * 1024))
+# Bump when prepare_data changes, so feature store entries encoded the old way are not reused
+ENCODING_SPEC = {
+    'version': 2,
+    'features': ['Category', 'Size', 'Type', 'Price', 'Content Rating', 'Genres'],
+    'one_hot': ['Category', 'Type', 'Content Rating'],
+    'multi_hot': MULTI_HOT_FEATURES,
+    'targets': TARGET_COLUMNS,
+    'rating_clip': [1.0, 5.0],
+    'dtype': 'float32',
+    'format': 'csr',
+}
+
+def _one_hot(values):
+    """CSR indicator block of a categorical column and its sorted vocabulary (missing values set nothing)"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Plain values keep the columns in the same order as a CSV read
+        values = values.astype(object)
+    codes, vocabulary = pd.factorize(values, sort=True)
+    rows = np.flatnonzero(codes >= 0)
+    block = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, codes[rows])), shape=(len(values), len(vocabulary))
+    )
+    return block, [str(value) for value in vocabulary]
+
+def _multi_hot(values):
+    """CSR block with one column per genre, from the CSV's list repr or the columnar artifact's lists"""
+    binarizer = MultiLabelBinarizer(sparse_output=True)
+    block = binarizer.fit_transform(values.map(parse_genres))
+    return sparse.csr_matrix(block, dtype=np.float32), [str(value) for value in binarizer.classes_]
+
 def prepare_data(df):
-    """Prepare features and target variables"""
-    X = df[['Category', 'Size', 'Type', 'Price', 'Content Rating', 'Genres']].copy()
+    """Prepare the sparse design matrix, its column names and the target variables"""
+    blocks = [sparse.csr_matrix(df[['Size', 'Price']].to_numpy(dtype=np.float32))]
+    feature_columns = ['Size', 'Price']
+    for column in ['Category', 'Type', 'Content Rating', 'Genres']:
+        block, vocabulary = (_multi_hot if column in MULTI_HOT_FEATURES else _one_hot)(df[column])
+        blocks.append(block)
+        feature_columns.extend(f"{column}_{value}" for value in vocabulary)
+    X = sparse.hstack(blocks, format='csr', dtype=np.float32)
     y = df[['Rating', 'Installs', 'Reviews']].copy()
     y.loc[:, 'Rating'] = y['Rating'].clip(1.0, 5.0)
-    X = pd.get_dummies(X, columns=['Category', 'Type', 'Content Rating', 'Genres'])
-    return X, y
+    return X, y, feature_columns
+
+def encode_dataset(data_path, use_cache=None, feature_store=None):
+    """Return the encoded design matrix of a cleaned dataset, from the feature store when it has it"""
+    def build():
+        X, y, feature_columns = prepare_data(read_dataset(data_path, columns=TRAINING_COLUMNS))
+        return X, y.to_numpy(dtype=np.float64), feature_columns, y.columns.tolist()
+
+    use_cache = FEATURE_STORE_ENABLED if use_cache is None else use_cache
+    if not use_cache:
+        return EncodedDataset(*build())
+    encoded = (feature_store or FeatureStore()).load_or_build(data_path, ENCODING_SPEC, build)
+    print(f"Feature store {'hit' if encoded.hit else 'miss'} for {data_path} ({encoded.key})")
+    return encoded
+
+def fit_matrix(X):
+    """The design matrix handed to model.fit: dense up to FIT_DENSE_MAX_BYTES, CSR beyond"""
+    if sparse.issparse(X) and X.shape[0] * X.shape[1] * np.dtype(np.float32).itemsize <= FIT_DENSE_MAX_BYTES:
+        return X.toarray()
+    return X
+
+def save_model(model_data, model_path=None, lookup_table=None, validate=None):
+    """Write the model artifact atomically; `validate(tmp_path)` may reject it by raising before it replaces the old one"""
+    if model_path is None:
+        model_path = os.path.join(os.path.dirname(__file__), 'trained_model.pkl')
+    trained_at = datetime.now()
+    model_data.setdefault('trained_at', trained_at.isoformat())
+    model_data.setdefault('version', trained_at.strftime('%Y%m%d%H%M%S%f'))
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(model_path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(model_data, f)
+        if validate is not None:
+            validate(tmp_path)
+        if lookup_table is not None:
+            # Written first so it is already in place when the new artifact is picked up
+            save_prediction_table(table_path(model_path), model_data['version'], **lookup_table)
+        os.replace(tmp_path, model_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return model_path
+
+def mean_absolute_errors(y_true, predictions):
+    return {
+        metric: float(np.mean(np.abs(y_true[:, i] - predictions[:, i])))
+        for i, metric in enumerate(TARGET_COLUMNS)
+    }
+
+def metrics_path(model_path):
+    """Holdout metrics of the published artifact, kept beside it so they can be read without unpickling it"""
+    return os.path.splitext(model_path)[0] + '.metrics.json'
+
+def read_published_metrics(model_path):
+    try:
+        with open(metrics_path(model_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
 
-def train_model(data_path):
+def holdout_validator(X_test, y_test, reference_metrics=None, max_regression=None):
+    """Build a save_model validate hook that checks a written artifact on the holdout set"""
+    max_regression = MAX_HOLDOUT_MAE_REGRESSION if max_regression is None else max_regression
+    X = X_test.astype(np.float32, copy=False)
+
+    def validate(path):
+        with open(path, 'rb') as f:
+            model_data = pickle.load(f)
+        predictions = model_data['model'].predict(X)
+        if not np.all(np.isfinite(predictions)):
+            raise ValueError("Model artifact gives non-finite predictions on the holdout set")
+        compiled = model_data.get('compiled')
+        if compiled is not None and not np.allclose(compiled.predict(X), predictions, rtol=1e-4, atol=1e-3):
+            raise ValueError("Compiled engine disagrees with the sklearn model on the holdout set")
+        errors = mean_absolute_errors(y_test, predictions)
+        for metric, error in errors.items():
+            reference = (reference_metrics or {}).get(metric)
+            if reference is not None and error > reference * max_regression:
+                raise ValueError(f"{metric} holdout MAE {error:.2f} regressed from the published {reference:.2f}")
+        return errors
+
+    return validate
+
+def build_lookup_table(model, encoder, X, combinations='observed', size_grid=None, price_grid=None, max_error=None):
+    """Precompute predictions over a Size/Price grid, or return None when interpolation misses by more than `max_error`"""
+    max_error = LOOKUP_TABLE_MAX_ERROR if max_error is None else max_error
+    if combinations == 'all':
+        combos = all_combinations(encoder)
+    else:
+        combos = observed_combinations(encoder, X)
+    print(f"Building lookup table for {len(combos)} combinations...")
+    values, size_grid, price_grid = build_prediction_table(model, encoder, combos, size_grid, price_grid)
+    table = {'combos': combos, 'size_grid': size_grid, 'price_grid': price_grid, 'values': values}
+
+    errors, compared = interpolation_error(PredictionTable(None, **table), encoder, X, model.predict)
+    summary = ', '.join(f"{metric} {error:.1%}" for metric, error in zip(TARGET_COLUMNS, errors))
+    print(f"Lookup table interpolation error on {compared} training rows (95th percentile): {summary}")
+    if np.any(errors > max_error):
+        print(f"Lookup table not published, error exceeds {max_error:.1%}")
+        return None
+    return table
+
+def _report(progress, stage, fraction):
+    if progress is not None:
+        progress(stage, fraction)
+
+def compile_model(model):
+    """Compiled engine for forest backends, None for models it cannot flatten"""
+    try:
+        return compile_forest(model)
+    except TypeError as e:
+        print(f"Serving without compiled engine: {e}")
+        return None
+
+def fit_and_save(data_path, lookup_table=False, lookup_combinations='observed', size_grid=None, price_grid=None,
+                 model_path=None, progress=None, use_feature_cache=None, backend=None):
+    """Train with `backend`, validate the artifact on the holdout set and publish it; returns the saved model data"""
+    backend = backend_name(backend)
+    _report(progress, 'loading', 0.0)
     print("Loading data...")
-    data = pd.read_csv(data_path)
-    X, y = prepare_data(data)
+    encoded = encode_dataset(data_path, use_feature_cache)
+    X, y, feature_columns = encoded.X, encoded.y, encoded.feature_columns
+    _report(progress, 'encoding', 0.1)
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    print("Training model...")
-    model = MultiOutputRegressor(RandomForestRegressor(n_estimators=300, random_state=42, n_jobs=-1))
-    model.fit(X_train, y_train)
+    _report(progress, 'fitting', 0.2)
+    print(f"Training {backend} model...")
+    model = build_estimator(backend)
+    model.fit(fit_matrix(X_train), y_train)
+    _report(progress, 'evaluating', 0.7)
     predictions = model.predict(X_test)
+    errors = mean_absolute_errors(y_test, predictions)
     print("\nModel Performance:")
-    metrics = ['Rating', 'Installs', 'Reviews']
-    for i, metric in enumerate(metrics):
-        error = np.mean(np.abs(y_test.iloc[:, i] - predictions[:, i]))
+    for metric, error in errors.items():
         print(f"{metric} Mean Absolute Error: {error:.2f}")
-    print("\nSaving model...")
+    _report(progress, 'compiling', 0.75)
+    size_fill = float(np.nanmedian(X[:, feature_columns.index('Size')].toarray()))
+    encoder = FeatureEncoder(feature_columns, size_fill=size_fill, multi_hot=MULTI_HOT_FEATURES)
     model_data = {
         'model': model,
-        'feature_columns': X.columns.tolist()
+        'feature_columns': feature_columns,
+        'encoder': encoder,
+        'backend': backend,
+        # Flat-array copy of every tree for low-latency single-row inference
+        'compiled': compile_model(model),
+        'metrics': errors,
     }
-    model_path = os.path.join(os.path.dirname(__file__), 'trained_model.pkl')
-    with open(model_path, 'wb') as f:
-        pickle.dump(model_data, f)
-    print("Training completed!")
-    return model, X.columns.tolist()
+    table = None
+    if lookup_table:
+        _report(progress, 'lookup_table', 0.8)
+        table = build_lookup_table(
+            model, encoder, X, lookup_combinations, size_grid, price_grid
+        )
+    _report(progress, 'validating', 0.9)
+    print("\nSaving model...")
+    model_path = model_path or os.path.join(os.path.dirname(__file__), 'trained_model.pkl')
+    validate = holdout_validator(X_test, y_test, read_published_metrics(model_path))
+    save_model(model_data, model_path, lookup_table=table, validate=validate)
+    with open(metrics_path(model_path), 'w') as f:
+        json.dump(errors, f)
+    _report(progress, 'done', 1.0)
+    print(f"Training completed! Model version: {model_data['version']}")
+    return model_data
+
+def train_model(data_path, lookup_table=False, lookup_combinations='observed', size_grid=None, price_grid=None,
+                use_feature_cache=None, backend=None):
+    model_data = fit_and_save(data_path, lookup_table, lookup_combinations, size_grid, price_grid,
+                              use_feature_cache=use_feature_cache, backend=backend)
+    return model_data['model'], model_data['feature_columns']
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Train the model on the cleaned dataset.")
-    parser.add_argument('--data_path', type=str, required=True, help='Path to the cleaned dataset CSV file')
+    parser.add_argument('--data_path', type=str, required=True, help='Path to the cleaned dataset (columnar artifact or CSV export)')
+    parser.add_argument('--lookup_table', action='store_true', help='Also precompute a prediction lookup table')
+    parser.add_argument('--lookup_combinations', choices=['observed', 'all'], default='observed', help='Categorical combinations to precompute')
+    parser.add_argument('--size_grid', type=float, nargs='+', help='Size (MB) grid points of the lookup table')
+    parser.add_argument('--price_grid', type=float, nargs='+', help='Price grid points of the lookup table')
+    parser.add_argument('--no_feature_cache', action='store_true', help='Encode the dataset again instead of using the feature store')
+    parser.add_argument('--backend', choices=list(BACKENDS), help='Estimator to train (defaults to MODEL_BACKEND)')
     args = parser.parse_args()
-    train_model(args.data_path)
+    train_model(args.data_path, args.lookup_table, args.lookup_combinations, args.size_grid, args.price_grid,
+                use_feature_cache=False if args.no_feature_cache else None, backend=args.backend)
@@ -0,0 +1,51 @@
+import argparse
+import time
+import pandas as pd
+from backend.dictionary import FilePath
+from backend.processor import (
+    clean_size, clean_installs, clean_price,
+    clean_size_column, clean_installs_column, clean_price_column
+)
+
+#python -m backend.benchmarks.cleaning_benchmark --replicas 10 100
+
+KERNELS = [
+    ('Size', clean_size, clean_size_column),
+    ('Installs', clean_installs, clean_installs_column),
+    ('Price', clean_price, clean_price_column),
+]
+
+
+def best_time(fn, repeats):
+    """Return (fastest seconds over repeats, last result) for fn()"""
+    best = None
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(data_path, replicas, repeats):
+    raw = pd.read_csv(data_path)
+    print(f"Base dataset: {len(raw)} rows")
+    print(f"\n{'replica':>8} {'rows':>9} {'column':>9} {'apply ms':>10} {'vector ms':>10} {'speedup':>8}")
+    for replica in replicas:
+        df = pd.concat([raw] * replica, ignore_index=True)
+        for column, scalar_fn, column_fn in KERNELS:
+            apply_time, expected = best_time(lambda: df[column].apply(scalar_fn), repeats)
+            vector_time, actual = best_time(lambda: column_fn(df[column]), repeats)
+            pd.testing.assert_series_equal(expected, actual, check_names=False)
+            print(f"{replica:>7}x {len(df):>9} {column:>9} {apply_time * 1000:>10.1f} {vector_time * 1000:>10.1f} "
+                  f"{apply_time / vector_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-cell apply cleaning with the vectorized kernels.")
+    parser.add_argument('--data_path', type=str, default=FilePath.DATASET.value, help='Raw dataset to replicate')
+    parser.add_argument('--replicas', type=int, nargs='+', default=[10, 100], help='Dataset replication factors')
+    parser.add_argument('--repeats', type=int, default=3, help='Timed runs per kernel, the fastest is reported')
+    args = parser.parse_args()
+    run(args.data_path, args.replicas, args.repeats)
@@ -0,0 +1,83 @@
+import os
+import argparse
+import pickle
+import time
+import tracemalloc
+import warnings
+import numpy as np
+import pandas as pd
+from backend.featureEncoder import FeatureEncoder
+from backend.forestCompiler import compile_forest
+
+#python -m backend.benchmarks.forest_benchmark --data_path ./data/cleaned_google_dataset.csv
+
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+
+def sample_inputs(data_path, n_rows, seed=42):
+    """Build /predict style inputs from rows of the cleaned dataset"""
+    df = pd.read_csv(data_path).sample(n_rows, replace=True, random_state=seed)
+    return [
+        {
+            'category': row['Category'],
+            'app_size': row['Size'],
+            'app_type': row['Type'],
+            'price': row['Price'],
+            'content_rating': row['Content Rating'],
+            'genres': row['Genres'],
+        }
+        for _, row in df.iterrows()
+    ]
+
+
+def measure(predict, X, repeats):
+    """Return (median seconds per call, peak traced bytes) for predict(X)"""
+    predict(X)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict(X)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    predict(X)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return float(np.median(timings)), peak
+
+
+def run(model_path, data_path, batch_sizes, repeats):
+    with open(model_path, 'rb') as f:
+        model_data = pickle.load(f)
+    model = model_data['model']
+    encoder = model_data.get('encoder') or FeatureEncoder(model_data['feature_columns'])
+
+    start = time.perf_counter()
+    compiled = model_data.get('compiled') or compile_forest(model)
+    compile_time = time.perf_counter() - start
+
+    print(f"Trees: {compiled.n_trees}, nodes: {len(compiled.feature)}, max depth: {compiled.max_depth}")
+    print(f"Pickled sklearn model: {len(pickle.dumps(model)) / 1e6:.1f} MB")
+    print(f"Compiled arrays: {compiled.nbytes / 1e6:.1f} MB (compile/load {compile_time:.2f}s)")
+
+    inputs = sample_inputs(data_path, max(batch_sizes))
+    X_all = encoder.encode_batch(inputs)
+    max_diff = np.max(np.abs(model.predict(X_all) - compiled.predict(X_all)))
+    print(f"Max abs difference vs sklearn: {max_diff:.3e}")
+
+    print(f"\n{'rows':>6} {'sklearn ms':>12} {'compiled ms':>12} {'speedup':>8} {'sklearn peak MB':>16} {'compiled peak MB':>17}")
+    for batch_size in batch_sizes:
+        X = X_all[:batch_size]
+        sk_time, sk_peak = measure(model.predict, X, repeats)
+        cf_time, cf_peak = measure(compiled.predict, X, repeats)
+        print(f"{batch_size:>6} {sk_time * 1000:>12.2f} {cf_time * 1000:>12.2f} {sk_time / cf_time:>8.1f}x "
+              f"{sk_peak / 1e6:>16.2f} {cf_peak / 1e6:>17.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare sklearn and compiled forest inference.")
+    parser.add_argument('--model_path', type=str, default=os.path.join(os.path.dirname(__file__), '..', 'trained_model.pkl'), help='Path to the trained model artifact')
+    parser.add_argument('--data_path', type=str, default='./data/cleaned_google_dataset.csv', help='Cleaned dataset used to build sample inputs')
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 8, 32, 128, 1024], help='Batch sizes to time')
+    parser.add_argument('--repeats', type=int, default=20, help='Timed calls per batch size')
+    args = parser.parse_args()
+    run(args.model_path, args.data_path, args.batch_sizes, args.repeats)
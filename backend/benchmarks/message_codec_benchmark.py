@@ -0,0 +1,91 @@
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from backend.dictionary import Action
+from backend.messageCodec import encode, decode, msgpack
+from backend.rowBatches import iter_csv_batches, batch_message
+
+#python -m backend.benchmarks.message_codec_benchmark --data_path ./data/cleaned_google_dataset.csv
+
+
+def sample_predictions(data_path, n_rows, seed=42):
+    """Build uploader prediction payloads from rows of the cleaned dataset"""
+    df = pd.read_csv(data_path).sample(n_rows, replace=True, random_state=seed)
+    return [
+        {
+            'Input Features': {
+                'category': row['Category'],
+                'app_size': str(row['Size']),
+                'app_type': row['Type'],
+                'price': float(row['Price']),
+                'content_rating': row['Content Rating'],
+                'genres': row['Genres'],
+            },
+            'Predictions': {
+                'Rating': float(row['Rating']),
+                'Installs': int(row['Installs']),
+                'Reviews': int(row['Reviews']),
+            },
+        }
+        for _, row in df.iterrows()
+    ]
+
+
+def measure(fn, repeats):
+    fn()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def run(data_path, raw_path, batch_size, batch_rows, repeats):
+    predictions = sample_predictions(data_path, batch_size)
+    columns, text, row_count = next(iter_csv_batches(raw_path, batch_rows))
+    messages = {
+        'prediction': {'action': Action.AIMODEL_UPLOADER_UPLOAD_PREDICTION.value, 'prediction_data': predictions[0]},
+        f'prediction batch ({batch_size})': {
+            'action': Action.AIMODEL_UPLOADER_UPLOAD_PREDICTION_BATCH.value, 'predictions': predictions,
+        },
+        f'raw row batch ({row_count})': batch_message(
+            Action.PRODUCER_UPLOADER_SEND_RAW_BATCH.value, 'benchmark', 0, columns, text, row_count,
+        ),
+    }
+    codecs = {
+        'json (today)': (lambda m: json.dumps(m).encode('utf-8'), json.loads),
+        'envelope json': (lambda m: encode(m, codec='json', compress_min_bytes=0), decode),
+        'envelope json+zlib': (lambda m: encode(m, codec='json'), decode),
+    }
+    if msgpack is not None:
+        codecs['envelope msgpack'] = (lambda m: encode(m, codec='msgpack', compress_min_bytes=0), decode)
+        codecs['envelope msgpack+zlib'] = (lambda m: encode(m, codec='msgpack'), decode)
+    else:
+        print("msgpack is not installed, skipping the msgpack codec")
+
+    for name, message in messages.items():
+        print(f"\n{name}")
+        print(f"{'codec':>22} {'bytes':>10} {'vs json':>8} {'encode us':>11} {'decode us':>11}")
+        baseline = None
+        for codec_name, (dumps, loads) in codecs.items():
+            body = dumps(message)
+            assert loads(body) == message, f"{codec_name} does not round trip {name}"
+            baseline = baseline or len(body)
+            encode_time = measure(lambda: dumps(message), repeats)
+            decode_time = measure(lambda: loads(body), repeats)
+            print(f"{codec_name:>22} {len(body):>10} {len(body) / baseline:>7.0%} "
+                  f"{encode_time * 1e6:>11.1f} {decode_time * 1e6:>11.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare pipeline message sizes and encode/decode times against JSON.")
+    parser.add_argument('--data_path', type=str, default='./data/cleaned_google_dataset.csv', help='Cleaned dataset used to build sample predictions')
+    parser.add_argument('--raw_path', type=str, default='./data/google_play_store_dataset.csv', help='Raw dataset used to build a row batch')
+    parser.add_argument('--batch_size', type=int, default=256, help='Predictions in the batch message')
+    parser.add_argument('--batch_rows', type=int, default=5000, help='Rows in the raw row batch message')
+    parser.add_argument('--repeats', type=int, default=50, help='Timed repetitions per measurement')
+    args = parser.parse_args()
+    run(args.data_path, args.raw_path, args.batch_size, args.batch_rows, args.repeats)
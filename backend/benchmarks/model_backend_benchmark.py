@@ -0,0 +1,67 @@
+import os
+import argparse
+import tempfile
+import time
+import numpy as np
+from sklearn.model_selection import train_test_split
+from backend.aimodelTrain import (
+    TARGET_COLUMNS, encode_dataset, fit_matrix, compile_model, mean_absolute_errors, save_model
+)
+from backend.modelBackends import BACKENDS, build_estimator
+from backend.modelRegistry import load_model_data
+
+#python -m backend.benchmarks.model_backend_benchmark --data_path ./data/cleaned_google_dataset.csv
+
+
+def measure(predict, X, repeats):
+    """Median seconds per predict(X) call"""
+    predict(X)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def run(data_path, backends, batch_size, repeats):
+    encoded = encode_dataset(data_path)
+    # The split fit_and_save uses, so the MAE columns match the published metrics
+    X_train, X_test, y_train, y_test = train_test_split(encoded.X, encoded.y, test_size=0.2, random_state=42)
+    row = X_test[:1].toarray()
+    batch = X_test[:batch_size]
+    print(f"Train {X_train.shape[0]} rows, test {X_test.shape[0]} rows, {X_train.shape[1]} features, {os.cpu_count()} CPUs")
+
+    mae_header = ' '.join(f"{'MAE ' + target:>16}" for target in TARGET_COLUMNS)
+    print(f"\n{'backend':>24} {'fit s':>8} {'artifact MB':>12} {'1 row ms':>9} {f'{batch_size} rows ms':>12} {mae_header}")
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in backends:
+            model = build_estimator(backend)
+            start = time.perf_counter()
+            model.fit(fit_matrix(X_train), y_train)
+            fit_time = time.perf_counter() - start
+
+            # Served the way the registry serves a published artifact
+            model_path = os.path.join(directory, f'{backend}.pkl')
+            save_model({
+                'model': model, 'feature_columns': encoded.feature_columns,
+                'backend': backend, 'compiled': compile_model(model),
+            }, model_path)
+            loaded = load_model_data(model_path)
+            row_time = measure(loaded.predict, row, repeats)
+            batch_time = measure(loaded.predict, batch, repeats)
+            errors = mean_absolute_errors(y_test, loaded.model.predict(X_test))
+
+            print(f"{backend:>24} {fit_time:>8.2f} {os.path.getsize(model_path) / 1e6:>12.1f} "
+                  f"{row_time * 1000:>9.2f} {batch_time * 1000:>12.2f} "
+                  + ' '.join(f"{errors[target]:>16.2f}" for target in TARGET_COLUMNS))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare model backends on fit time, artifact size, latency and holdout MAE.")
+    parser.add_argument('--data_path', type=str, default='./data/cleaned_google_dataset.csv', help='Cleaned dataset to train on')
+    parser.add_argument('--backends', nargs='+', choices=list(BACKENDS), default=list(BACKENDS), help='Backends to compare')
+    parser.add_argument('--batch_size', type=int, default=1024, help='Rows in the batch latency measurement')
+    parser.add_argument('--repeats', type=int, default=20, help='Timed calls per latency measurement')
+    args = parser.parse_args()
+    run(args.data_path, args.backends, args.batch_size, args.repeats)
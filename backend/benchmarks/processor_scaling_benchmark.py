@@ -0,0 +1,65 @@
+import os
+import argparse
+import filecmp
+import tempfile
+import time
+import pandas as pd
+from backend.dictionary import FilePath
+from backend.processor import clean_file
+
+#python -m backend.benchmarks.processor_scaling_benchmark --replicas 50 --workers 1 2 4
+
+
+def build_replica(data_path, replicas, directory):
+    """Write `replicas` copies of the raw dataset to one CSV"""
+    raw = pd.read_csv(data_path, dtype=str)
+    path = os.path.join(directory, f'replica_{replicas}x.csv')
+    pd.concat([raw] * replicas, ignore_index=True).to_csv(path, index=False)
+    return path, len(raw) * replicas
+
+
+def check_identical(data_path, worker_counts, directory):
+    """Clean the dataset as shipped, with the default shard size, and compare every worker count's CSV.
+
+    The replicated timing input gives every shard the same mix of rows, so it
+    cannot catch output that depends on where the shard boundaries fall.
+    """
+    baseline_path = None
+    for workers in worker_counts:
+        output_path = os.path.join(directory, f'check_{workers}.csv')
+        clean_file(data_path, csv_path=output_path, workers=workers)
+        if baseline_path is None:
+            baseline_path = output_path
+        elif not filecmp.cmp(baseline_path, output_path, shallow=False):
+            raise AssertionError(f"{data_path} cleaned with {workers} workers differs from {worker_counts[0]} worker(s)")
+    print(f"Output identical for {', '.join(map(str, worker_counts))} workers on {data_path}")
+
+
+def run(data_path, replicas, worker_counts, chunk_rows):
+    with tempfile.TemporaryDirectory() as directory:
+        check_identical(data_path, worker_counts, directory)
+        input_path, rows = build_replica(data_path, replicas, directory)
+        print(f"Input: {rows} rows ({os.path.getsize(input_path) / 1e6:.1f} MB), {os.cpu_count()} CPUs")
+        print(f"\n{'workers':>8} {'seconds':>9} {'rows/sec':>10} {'speedup':>8}")
+        baseline_time = None
+        baseline_path = None
+        for workers in worker_counts:
+            output_path = os.path.join(directory, f'cleaned_{workers}.csv')
+            start = time.perf_counter()
+            clean_file(input_path, csv_path=output_path, workers=workers, chunk_rows=chunk_rows)
+            elapsed = time.perf_counter() - start
+            if baseline_time is None:
+                baseline_time, baseline_path = elapsed, output_path
+            elif not filecmp.cmp(baseline_path, output_path, shallow=False):
+                raise AssertionError(f"Output with {workers} workers differs from {worker_counts[0]} worker(s)")
+            print(f"{workers:>8} {elapsed:>9.2f} {rows / elapsed:>10.0f} {baseline_time / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure processor scaling over worker processes.")
+    parser.add_argument('--data_path', type=str, default=FilePath.DATASET.value, help='Raw dataset to replicate')
+    parser.add_argument('--replicas', type=int, default=50, help='Dataset replication factor')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1], help='Worker counts to time')
+    parser.add_argument('--chunk_rows', type=int, default=50000, help='Rows per shard')
+    args = parser.parse_args()
+    run(args.data_path, args.replicas, sorted(set(args.workers)), args.chunk_rows)
@@ -0,0 +1,176 @@
+import io
+import os
+import time
+import logging
+import numpy as np
+import pandas as pd
+import psycopg2
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_ROWS = int(os.getenv('COPY_CHUNK_ROWS', 20000))
+EXECUTE_VALUES_PAGE_SIZE = int(os.getenv('EXECUTE_VALUES_PAGE_SIZE', 1000))
+
+INTEGER_TYPES = {'smallint', 'integer', 'bigint'}
+
+# COPY is refused on some managed databases, those errors switch to execute_values
+COPY_UNAVAILABLE_ERRORS = (
+    psycopg2.errors.InsufficientPrivilege,
+    psycopg2.errors.FeatureNotSupported,
+)
+
+
+def get_column_types(cursor, table):
+    """Return {column: data_type} for a table (temporary tables included) from information_schema"""
+    cursor.execute(
+        "SELECT column_name, data_type FROM information_schema.columns "
+        "WHERE table_name = %s AND table_schema = ANY(current_schemas(true))",
+        (table,)
+    )
+    return dict(cursor.fetchall())
+
+
+def _escape_copy_text(values):
+    return (
+        values.str.replace('\\', '\\\\', regex=False)
+        .str.replace('\t', '\\t', regex=False)
+        .str.replace('\n', '\\n', regex=False)
+        .str.replace('\r', '\\r', regex=False)
+    )
+
+
+def _format_list(value, as_array):
+    if as_array:
+        items = ['"' + str(item).replace('\\', '\\\\').replace('"', '\\"') + '"' for item in value]
+        return '{' + ','.join(items) + '}'
+    # Keep the same representation the row-by-row INSERT used to store
+    return str(list(value))
+
+
+def format_copy_column(series, data_type=None):
+    """Render one column as an array of COPY text-format fields, with \\N for NULL"""
+    null_mask = series.isna().to_numpy()
+
+    if pd.api.types.is_datetime64_any_dtype(series):
+        text = series.dt.strftime('%Y-%m-%d %H:%M:%S.%f').to_numpy(dtype=object)
+    elif pd.api.types.is_bool_dtype(series):
+        text = np.where(series.to_numpy(dtype=bool, na_value=False), 't', 'f').astype(object)
+    elif pd.api.types.is_integer_dtype(series):
+        text = series.astype(str).to_numpy(dtype=object)
+    elif pd.api.types.is_numeric_dtype(series):
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        text = values.astype(str).astype(object)
+        finite = np.isfinite(values)
+        if data_type in INTEGER_TYPES:
+            # 159.0 has to reach an integer column as 159
+            integral = finite & (np.mod(values, 1, where=finite, out=np.ones_like(values)) == 0)
+            text[integral] = values[integral].astype(np.int64).astype(str)
+        infinite = np.isinf(values)
+        text[infinite] = np.where(values[infinite] > 0, 'Infinity', '-Infinity')
+    else:
+        as_array = data_type == 'ARRAY'
+        text = series.map(
+            lambda value: _format_list(value, as_array) if isinstance(value, (list, tuple, np.ndarray)) else value
+        )
+        text = _escape_copy_text(text.astype(str)).to_numpy(dtype=object)
+
+    text[null_mask] = '\\N'
+    return text
+
+
+def dataframe_to_copy_buffer(df, column_types=None):
+    """Serialise a DataFrame into an in-memory COPY text-format buffer"""
+    column_types = column_types or [None] * df.shape[1]
+    columns = [
+        format_copy_column(df.iloc[:, i], data_type)
+        for i, data_type in enumerate(column_types)
+    ]
+    buffer = io.StringIO()
+    if len(df):
+        lines = columns[0]
+        for column in columns[1:]:
+            lines = lines + '\t' + column
+        buffer.write('\n'.join(lines))
+        buffer.write('\n')
+    buffer.seek(0)
+    return buffer
+
+
+def _python_value(value):
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return str(list(value))
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value
+
+
+def _iter_chunks(frames, chunk_rows):
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
+    for frame in frames:
+        for start in range(0, len(frame), chunk_rows):
+            yield frame.iloc[start:start + chunk_rows]
+
+
+def copy_chunk(cursor, table, db_columns, chunk, column_types):
+    buffer = dataframe_to_copy_buffer(chunk, column_types)
+    cursor.copy_expert(f"COPY {table} ({', '.join(db_columns)}) FROM STDIN", buffer)
+
+
+def insert_chunk(cursor, table, db_columns, chunk):
+    rows = [tuple(_python_value(value) for value in row) for row in chunk.itertuples(index=False, name=None)]
+    execute_values(
+        cursor,
+        f"INSERT INTO {table} ({', '.join(db_columns)}) VALUES %s",
+        rows,
+        page_size=EXECUTE_VALUES_PAGE_SIZE
+    )
+
+
+def bulk_load(conn, table, db_columns, frames, source_columns=None, chunk_rows=None):
+    """Stream DataFrames into a table with COPY, falling back to execute_values.
+
+    `frames` is a DataFrame or an iterable of DataFrames; `source_columns`
+    picks and orders the frame columns matching `db_columns`. The caller owns
+    the transaction. Returns the number of rows loaded.
+    """
+    chunk_rows = chunk_rows or COPY_CHUNK_ROWS
+    cursor = conn.cursor()
+    try:
+        types = get_column_types(cursor, table)
+        column_types = [types.get(column) for column in db_columns]
+        use_copy = True
+        total_rows = 0
+        start = time.perf_counter()
+
+        for chunk in _iter_chunks(frames, chunk_rows):
+            if source_columns is not None:
+                chunk = chunk[source_columns]
+            if use_copy:
+                cursor.execute("SAVEPOINT bulk_copy")
+                try:
+                    copy_chunk(cursor, table, db_columns, chunk, column_types)
+                    cursor.execute("RELEASE SAVEPOINT bulk_copy")
+                except COPY_UNAVAILABLE_ERRORS as e:
+                    logger.warning(f"[BULK] COPY not permitted on {table} ({e}), falling back to execute_values")
+                    cursor.execute("ROLLBACK TO SAVEPOINT bulk_copy")
+                    use_copy = False
+            if not use_copy:
+                insert_chunk(cursor, table, db_columns, chunk)
+
+            total_rows += len(chunk)
+            elapsed = time.perf_counter() - start
+            logger.info(f"[BULK] {table}: {total_rows} rows loaded ({total_rows / max(elapsed, 1e-9):.0f} rows/sec)")
+
+        elapsed = time.perf_counter() - start
+        method = 'COPY' if use_copy else 'execute_values'
+        logger.info(f"[BULK] Loaded {total_rows} rows into {table} via {method} in {elapsed:.2f}s "
+                    f"({total_rows / max(elapsed, 1e-9):.0f} rows/sec)")
+        return total_rows
+    finally:
+        cursor.close()
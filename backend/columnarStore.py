@@ -0,0 +1,371 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# auto picks Parquet when pyarrow is installed and per-column .npy files otherwise
+COLUMNAR_FORMAT = os.getenv('COLUMNAR_FORMAT', 'auto')
+READ_BATCH_ROWS = int(os.getenv('COLUMNAR_READ_BATCH_ROWS', 50000))
+
+MANIFEST_NAME = 'manifest.json'
+NPY_FORMAT_VERSION = 1
+NPY_SUFFIX = '.columns'
+PARQUET_SUFFIX = '.parquet'
+
+
+def columnar_format(fmt=None):
+    """Resolve 'auto' to the format this environment can write"""
+    fmt = fmt or COLUMNAR_FORMAT
+    if fmt == 'auto':
+        return 'parquet' if pq is not None else 'npy'
+    if fmt == 'parquet' and pq is None:
+        raise ImportError("pyarrow is required for the parquet columnar format")
+    if fmt not in ('parquet', 'npy'):
+        raise ValueError(f"Unknown columnar format: {fmt}")
+    return fmt
+
+
+def artifact_path(base_path, fmt=None):
+    """Columnar artifact path next to base_path, e.g. data/cleaned.parquet for data/cleaned.csv"""
+    suffix = PARQUET_SUFFIX if columnar_format(fmt) == 'parquet' else NPY_SUFFIX
+    return os.path.splitext(base_path)[0] + suffix
+
+
+def is_columnar(path):
+    return path.endswith(PARQUET_SUFFIX) or os.path.isfile(os.path.join(path, MANIFEST_NAME))
+
+
+def _replace(temp_path, path):
+    """Move a finished artifact into place, replacing a previous file or directory"""
+    if os.path.isdir(path) and not os.path.islink(path):
+        old_path = path + '.old'
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.replace(path, old_path)
+        os.replace(temp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+    else:
+        os.replace(temp_path, path)
+
+
+def _column_kind(series, categorical, list_columns):
+    if series.name in list_columns:
+        return 'list'
+    if series.name in categorical:
+        return 'category'
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+        return 'numeric'
+    return 'string'
+
+
+def _is_list(value):
+    return isinstance(value, (list, tuple, np.ndarray))
+
+
+class _NpyColumn:
+    """Appends one column to raw part files and turns them into .npy files on close"""
+
+    def __init__(self, directory, index, name, kind, dtype=None):
+        self.directory = directory
+        self.prefix = f'c{index}'
+        self.name = name
+        self.kind = kind
+        self.dtype = dtype
+        self.categories = {}
+        self.rows = 0
+        self.base = 0
+        self.parts = {}
+        if kind in ('string', 'list'):
+            self._write('offsets', np.zeros(1, dtype=np.int64))
+
+    def _write(self, part, array):
+        if part not in self.parts:
+            path = os.path.join(self.directory, f'{self.prefix}.{part}.part')
+            self.parts[part] = [open(path, 'wb'), array.dtype, 0]
+        entry = self.parts[part]
+        entry[0].write(np.ascontiguousarray(array).tobytes())
+        entry[2] += len(array)
+
+    def _codes(self, values):
+        """Global int32 category codes for an array of values, -1 for missing"""
+        local_codes, uniques = pd.factorize(values)
+        mapping = np.array([self.categories.setdefault(value, len(self.categories)) for value in uniques] + [-1],
+                           dtype=np.int32)
+        return mapping[local_codes]
+
+    def append(self, series):
+        if self.kind == 'numeric':
+            self._write('values', series.to_numpy(dtype=self.dtype))
+        elif self.kind == 'category':
+            self._write('codes', self._codes(series.to_numpy(dtype=object)))
+        elif self.kind == 'string':
+            valid = series.notna().to_numpy()
+            encoded = [value.encode('utf-8') if ok else b'' for value, ok in zip(series.to_numpy(dtype=object), valid)]
+            lengths = np.fromiter((len(value) for value in encoded), dtype=np.int64, count=len(encoded))
+            self._write('data', np.frombuffer(b''.join(encoded), dtype=np.uint8))
+            self._write('offsets', self.base + np.cumsum(lengths))
+            self._write('valid', valid)
+            self.base += int(lengths.sum())
+        else:
+            values = series.to_numpy(dtype=object)
+            valid = np.fromiter((_is_list(value) for value in values), dtype=bool, count=len(values))
+            lengths = np.fromiter((len(value) if ok else 0 for value, ok in zip(values, valid)),
+                                  dtype=np.int64, count=len(values))
+            items = [item for value, ok in zip(values, valid) if ok for item in value]
+            self._write('codes', self._codes(np.array(items, dtype=object)))
+            self._write('offsets', self.base + np.cumsum(lengths))
+            self._write('valid', valid)
+            self.base += int(lengths.sum())
+        self.rows += len(series)
+
+    def close(self):
+        files = {}
+        for part, (handle, dtype, count) in self.parts.items():
+            handle.close()
+            raw_path = handle.name
+            file_name = f'{self.prefix}.{part}.npy'
+            with open(os.path.join(self.directory, file_name), 'wb') as out, open(raw_path, 'rb') as raw:
+                np.lib.format.write_array_header_2_0(out, {
+                    'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                    'fortran_order': False,
+                    'shape': (count,),
+                })
+                shutil.copyfileobj(raw, out, 16 << 20)
+            os.remove(raw_path)
+            files[part] = file_name
+        entry = {'name': self.name, 'kind': self.kind, 'files': files}
+        if self.kind == 'numeric':
+            entry['dtype'] = np.dtype(self.dtype).str
+        if self.kind in ('category', 'list'):
+            entry['categories'] = list(self.categories)
+        return entry
+
+
+class ColumnarWriter:
+    """Streams DataFrame chunks into a typed columnar artifact.
+
+    The schema comes from the first chunk: numeric and datetime columns
+    keep their dtype, `categorical` columns are dictionary encoded and
+    `list_columns` hold lists of strings. Parquet gets one row group per
+    chunk; the .npy layout gets one memory-mappable file per column part
+    plus a manifest. The artifact only appears at `path` once close()
+    has finished.
+    """
+
+    def __init__(self, path, categorical=(), list_columns=()):
+        self.path = path
+        # The suffix picks the layout, see artifact_path
+        self.format = 'parquet' if path.endswith(PARQUET_SUFFIX) else 'npy'
+        if self.format == 'parquet' and pq is None:
+            raise ImportError("pyarrow is required for the parquet columnar format")
+        self.categorical = set(categorical)
+        self.list_columns = set(list_columns)
+        self.temp_path = path + '.tmp'
+        self.rows = 0
+        self._columns = None
+        self._kinds = None
+        self._writer = None
+        self._schema = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _start(self, df):
+        self._columns = list(df.columns)
+        self._kinds = {column: _column_kind(df[column], self.categorical, self.list_columns) for column in df.columns}
+        if self.format == 'parquet':
+            fields = []
+            for column in self._columns:
+                kind = self._kinds[column]
+                if kind == 'category':
+                    field_type = pa.dictionary(pa.int32(), pa.string())
+                elif kind == 'list':
+                    field_type = pa.list_(pa.string())
+                elif kind == 'string':
+                    field_type = pa.string()
+                else:
+                    field_type = pa.from_numpy_dtype(df[column].to_numpy().dtype)
+                fields.append(pa.field(column, field_type))
+            self._schema = pa.schema(fields)
+            self._writer = pq.ParquetWriter(self.temp_path, self._schema)
+        else:
+            shutil.rmtree(self.temp_path, ignore_errors=True)
+            os.makedirs(self.temp_path)
+            self._writer = [
+                _NpyColumn(self.temp_path, index, column, self._kinds[column],
+                           df[column].to_numpy().dtype if self._kinds[column] == 'numeric' else None)
+                for index, column in enumerate(self._columns)
+            ]
+
+    def append(self, df):
+        if self._columns is None:
+            self._start(df)
+        df = df[self._columns]
+        if self.format == 'parquet':
+            arrays = []
+            for column, field in zip(self._columns, self._schema):
+                kind = self._kinds[column]
+                values = df[column]
+                if kind == 'list':
+                    values = [[str(item) for item in value] if _is_list(value) else None for value in values]
+                elif kind in ('category', 'string'):
+                    values = values.astype(object).where(values.notna(), None)
+                arrays.append(pa.array(values, type=field.type, from_pandas=True))
+            self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+        else:
+            for column in self._writer:
+                column.append(df[column.name])
+        self.rows += len(df)
+
+    def close(self):
+        if self._columns is None:
+            raise ValueError("Cannot write a columnar artifact without any chunk")
+        if self.format == 'parquet':
+            self._writer.close()
+        else:
+            manifest = {
+                'version': NPY_FORMAT_VERSION,
+                'rows': self.rows,
+                'columns': [column.close() for column in self._writer],
+            }
+            with open(os.path.join(self.temp_path, MANIFEST_NAME), 'w') as f:
+                json.dump(manifest, f)
+        _replace(self.temp_path, self.path)
+        return self.path
+
+    def abort(self):
+        try:
+            if self.format == 'parquet' and self._writer is not None:
+                self._writer.close()
+            elif self._writer is not None:
+                for column in self._writer:
+                    for handle, _, _ in column.parts.values():
+                        handle.close()
+        finally:
+            if os.path.isdir(self.temp_path):
+                shutil.rmtree(self.temp_path, ignore_errors=True)
+            elif os.path.exists(self.temp_path):
+                os.remove(self.temp_path)
+
+
+def write_columnar(df, path, categorical=(), list_columns=()):
+    """Write a single DataFrame as a columnar artifact"""
+    with ColumnarWriter(path, categorical, list_columns) as writer:
+        writer.append(df)
+    return path
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def _load_npy_columns(path, manifest, columns):
+    loaded = []
+    for entry in manifest['columns']:
+        if columns is not None and entry['name'] not in columns:
+            continue
+        arrays = {
+            part: np.load(os.path.join(path, file_name), mmap_mode='r')
+            for part, file_name in entry['files'].items()
+        }
+        categories = np.array(entry.get('categories', []), dtype=object)
+        loaded.append((entry, arrays, categories))
+    return loaded
+
+
+def _npy_slice(entry, arrays, categories, start, stop):
+    kind = entry['kind']
+    name = entry['name']
+    if kind == 'numeric':
+        return pd.Series(np.asarray(arrays['values'][start:stop]), name=name)
+    if kind == 'category':
+        codes = np.asarray(arrays['codes'][start:stop])
+        return pd.Series(pd.Categorical.from_codes(codes, categories=categories), name=name)
+    offsets = np.asarray(arrays['offsets'][start:stop + 1])
+    valid = np.asarray(arrays['valid'][start:stop])
+    bounds = offsets - offsets[0]
+    if kind == 'string':
+        data = bytes(arrays['data'][offsets[0]:offsets[-1]])
+        values = [
+            data[bounds[i]:bounds[i + 1]].decode('utf-8') if valid[i] else None
+            for i in range(len(valid))
+        ]
+        return pd.Series(values, name=name, dtype='str')
+    items = categories[np.asarray(arrays['codes'][offsets[0]:offsets[-1]])] if len(categories) else categories
+    values = [
+        items[bounds[i]:bounds[i + 1]].tolist() if valid[i] else None
+        for i in range(len(valid))
+    ]
+    return pd.Series(values, name=name, dtype=object)
+
+
+def _arrow_to_pandas(batch):
+    data = {}
+    for name, column in zip(batch.schema.names, batch.columns):
+        if pa.types.is_list(column.type):
+            data[name] = pd.Series(column.to_pylist(), dtype=object)
+        else:
+            data[name] = column.to_pandas()
+    return pd.DataFrame(data)
+
+
+def iter_columnar(path, batch_rows=None, columns=None):
+    """Yield the artifact as DataFrames of at most batch_rows rows"""
+    batch_rows = batch_rows or READ_BATCH_ROWS
+    if path.endswith(PARQUET_SUFFIX):
+        if pq is None:
+            raise ImportError("pyarrow is required to read a parquet columnar artifact")
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=batch_rows, columns=columns):
+            yield _arrow_to_pandas(batch)
+        return
+    manifest = read_manifest(path)
+    loaded = _load_npy_columns(path, manifest, columns)
+    for start in range(0, manifest['rows'], batch_rows):
+        stop = min(start + batch_rows, manifest['rows'])
+        yield pd.DataFrame({
+            entry['name']: _npy_slice(entry, arrays, categories, start, stop)
+            for entry, arrays, categories in loaded
+        })
+
+
+def read_columnar(path, columns=None):
+    """Read the whole artifact into one DataFrame"""
+    if path.endswith(PARQUET_SUFFIX):
+        if pq is None:
+            raise ImportError("pyarrow is required to read a parquet columnar artifact")
+        return _arrow_to_pandas(pq.read_table(path, columns=columns))
+    manifest = read_manifest(path)
+    loaded = _load_npy_columns(path, manifest, columns)
+    return pd.DataFrame({
+        entry['name']: _npy_slice(entry, arrays, categories, 0, manifest['rows'])
+        for entry, arrays, categories in loaded
+    })
+
+
+def read_dataset(path, columns=None):
+    """Read a cleaned dataset from either a columnar artifact or a CSV export"""
+    if is_columnar(path):
+        return read_columnar(path, columns)
+    return pd.read_csv(path, usecols=columns)
+
+
+def iter_dataset(path, batch_rows=None, columns=None):
+    """Chunked version of read_dataset"""
+    if is_columnar(path):
+        return iter_columnar(path, batch_rows, columns)
+    return pd.read_csv(path, usecols=columns, chunksize=batch_rows or READ_BATCH_ROWS)
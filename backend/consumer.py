@@ -0,0 +1,223 @@
+import os
+import time
+import logging
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pika
+from backend.dbPool import CONNECTION_ERRORS
+
+logger = logging.getLogger(__name__)
+
+RABBITMQ_HOST = os.getenv('RABBITMQ_HOST', 'rabbitmq')
+# Handler failures a redelivery can get past, anything else would fail the same way again
+TRANSIENT_ERRORS = CONNECTION_ERRORS + (TimeoutError,)
+
+
+def consumer_settings(prefix, prefetch=None, workers=1):
+    """Read {prefix}_PREFETCH and {prefix}_CONSUMER_WORKERS, prefetch defaults to one message per worker"""
+    workers = int(os.getenv(f'{prefix}_CONSUMER_WORKERS', workers))
+    prefetch = int(os.getenv(f'{prefix}_PREFETCH', prefetch if prefetch is not None else workers))
+    return {'prefetch': prefetch, 'workers': workers}
+
+
+class ThreadsafeChannel:
+    """Channel stand-in handed to message handlers running on worker threads.
+
+    pika channels may only be used from their connection's thread, so
+    acks, nacks and rejects are scheduled there with
+    add_callback_threadsafe. Anything else is passed to the real channel.
+    """
+
+    def __init__(self, channel):
+        self._channel = channel
+        self.connection = channel.connection
+
+    def _on_connection_thread(self, method_name, kwargs):
+        try:
+            getattr(self._channel, method_name)(**kwargs)
+        except Exception as e:
+            # The delivery is redelivered by the broker once the channel is gone
+            logger.error(f"[CONSUMER] Could not {method_name} delivery {kwargs.get('delivery_tag')}: {e}")
+
+    def _call(self, method_name, **kwargs):
+        try:
+            self.connection.add_callback_threadsafe(
+                functools.partial(self._on_connection_thread, method_name, kwargs)
+            )
+        except Exception as e:
+            logger.error(f"[CONSUMER] Could not {method_name} delivery {kwargs.get('delivery_tag')}: {e}")
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        self._call('basic_ack', delivery_tag=delivery_tag, multiple=multiple)
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        self._call('basic_nack', delivery_tag=delivery_tag, multiple=multiple, requeue=requeue)
+
+    def basic_reject(self, delivery_tag=0, requeue=True):
+        self._call('basic_reject', delivery_tag=delivery_tag, requeue=requeue)
+
+    def __getattr__(self, name):
+        return getattr(self._channel, name)
+
+
+class Consumer:
+    """Consumes one queue with a bounded prefetch and a pool of worker threads.
+
+    The connection thread only receives deliveries and hands them to
+    `workers` threads, so heartbeats keep flowing while a long handler
+    runs. Handlers keep the usual (ch, method, properties, body)
+    signature and ack through `ch`, which is a ThreadsafeChannel. At most
+    `prefetch` deliveries are unacked at once (0 means no limit). A
+    delivery whose handler raises one of TRANSIENT_ERRORS is requeued;
+    any other failure is logged and the delivery dropped, so it cannot
+    hold a prefetch slot or come straight back and fail again.
+
+    `on_start(channel)` runs once the queue is declared, on every
+    (re)connect, for anything else the handlers expect the broker to have.
+    On shutdown the consumer is cancelled, in-flight handlers are allowed
+    to finish and their acks are sent before `on_stop(connection)` runs
+    and the connection is closed.
+    """
+
+    def __init__(self, queue, on_message, name=None, host=None, prefetch=1, workers=1,
+                 queue_options=None, on_start=None, on_stop=None, max_retries=5, retry_delay=5):
+        self.queue = queue
+        self.on_message = on_message
+        self.name = name or queue
+        self.host = host or RABBITMQ_HOST
+        self.prefetch = prefetch
+        self.workers = workers
+        self.queue_options = queue_options if queue_options is not None else {}
+        self.on_start = on_start
+        self.on_stop = on_stop
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.error = None
+        self._connection = None
+        self._channel = None
+        self._stopping = False
+        self._thread = None
+        self._executor = None
+        self._in_flight = set()
+        self._in_flight_lock = threading.Lock()
+
+    def start(self):
+        """Consume on a background thread"""
+        self._thread = threading.Thread(target=self._run_in_thread, name=f"consumer-{self.name}", daemon=True)
+        self._thread.start()
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def stop(self):
+        """Ask the consumer to stop, callable from any thread"""
+        self._stopping = True
+        connection, channel = self._connection, self._channel
+        if connection is not None and channel is not None and not connection.is_closed:
+            try:
+                connection.add_callback_threadsafe(channel.stop_consuming)
+            except Exception as e:
+                logger.error(f"[CONSUMER] Could not stop {self.name}: {e}")
+
+    def _run_in_thread(self):
+        try:
+            self.run()
+        except Exception as e:
+            self.error = e
+
+    def _dispatch(self, ch, method, properties, body):
+        future = self._executor.submit(self._handle, ThreadsafeChannel(ch), method, properties, body)
+        with self._in_flight_lock:
+            self._in_flight.add(future)
+        future.add_done_callback(self._done)
+
+    def _handle(self, ch, method, properties, body):
+        try:
+            self.on_message(ch, method, properties, body)
+        except TRANSIENT_ERRORS as e:
+            logger.warning(f"[CONSUMER] {self.name} handler failed on delivery {method.delivery_tag}, requeueing it: {e}")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+        except Exception as e:
+            logger.error(f"[CONSUMER] {self.name} handler failed on delivery {method.delivery_tag}, dropping it: {e}")
+            ch.basic_reject(delivery_tag=method.delivery_tag, requeue=False)
+
+    def _done(self, future):
+        with self._in_flight_lock:
+            self._in_flight.discard(future)
+
+    def _drain(self, connection):
+        """Pump the connection until in-flight handlers have finished and acked"""
+        while True:
+            with self._in_flight_lock:
+                pending = len(self._in_flight)
+            if not pending:
+                break
+            connection.process_data_events(time_limit=0.1)
+        connection.process_data_events(time_limit=0)
+
+    def _shutdown(self, connection, channel):
+        logger.info(f"[CONSUMER] Stopping {self.name}, waiting for in-flight messages...")
+        if channel.is_open:
+            channel.stop_consuming()
+        self._drain(connection)
+        if self.on_stop is not None:
+            self.on_stop(connection)
+
+    def run(self):
+        """Consume on the calling thread until stopped, reconnecting on connection errors"""
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{self.name}-worker")
+        attempt = 0
+        try:
+            while not self._stopping:
+                connection = None
+                try:
+                    logger.info(f"[CONSUMER] {self.name} connecting to RabbitMQ (attempt {attempt + 1}/{self.max_retries})...")
+                    connection = pika.BlockingConnection(
+                        pika.ConnectionParameters(
+                            host=self.host,
+                            heartbeat=600,
+                            blocked_connection_timeout=300
+                        )
+                    )
+                    channel = connection.channel()
+                    channel.queue_declare(queue=self.queue, **self.queue_options)
+                    if self.on_start is not None:
+                        self.on_start(channel)
+                    if self.prefetch:
+                        channel.basic_qos(prefetch_count=self.prefetch)
+                    channel.basic_consume(queue=self.queue, on_message_callback=self._dispatch)
+                    self._connection, self._channel = connection, channel
+                    attempt = 0
+                    logger.info(f"[CONSUMER] {self.name} listening on {self.queue} "
+                                f"(prefetch {self.prefetch}, {self.workers} workers)")
+
+                    try:
+                        if not self._stopping:
+                            channel.start_consuming()
+                    except KeyboardInterrupt:
+                        self._stopping = True
+                    self._shutdown(connection, channel)
+                    return
+
+                except Exception as e:
+                    if self._stopping:
+                        logger.error(f"[CONSUMER] {self.name} connection lost while stopping: {e}")
+                        return
+                    attempt += 1
+                    logger.error(f"[CONSUMER] {self.name} RabbitMQ connection error (attempt {attempt}/{self.max_retries}): {e}")
+                    if attempt >= self.max_retries:
+                        logger.error(f"[CONSUMER] Max retries reached. {self.name} could not connect to RabbitMQ.")
+                        raise
+                    logger.info(f"[CONSUMER] Retrying in {self.retry_delay} seconds...")
+                    time.sleep(self.retry_delay)
+                finally:
+                    self._connection = self._channel = None
+                    if connection and not connection.is_closed:
+                        connection.close()
+                        logger.info(f"[CONSUMER] {self.name} connection closed")
+        finally:
+            self._executor.shutdown(wait=True)
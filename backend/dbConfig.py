@@ -0,0 +1,64 @@
+import os
+import time
+import logging
+import psycopg2
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+DB_USER = os.environ.get('user')
+DB_PASSWORD = os.environ.get('password')
+DB_HOST = os.environ.get('host')
+DB_PORT = os.environ.get('port', '5432')
+DB_NAME = os.environ.get('dbname')
+
+DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?sslmode=require"
+
+
+def require_settings():
+    """Raise ValueError for the first database environment variable that is not set"""
+    if not DB_HOST:
+        raise ValueError("host environment variable is not set")
+    if not DB_USER:
+        raise ValueError("user environment variable is not set")
+    if not DB_PASSWORD:
+        raise ValueError("password environment variable is not set")
+    if not DB_NAME:
+        raise ValueError("dbname environment variable is not set")
+
+
+def log_settings(service):
+    logger.info(f"[{service}] host: {DB_HOST}")
+    logger.info(f"[{service}] port: {DB_PORT}")
+    logger.info(f"[{service}] user: {DB_USER}")
+    logger.info(f"[{service}] dbname: {DB_NAME}")
+    safe_conn_string = DATABASE_URL.replace(DB_PASSWORD, '****')
+    logger.info(f"[{service}] Database connection string: {safe_conn_string}")
+
+
+def create_connection(service='DB'):
+    """Create and return a new database connection"""
+    require_settings()
+    max_retries = 5
+    retry_delay = 5
+
+    for attempt in range(max_retries):
+        try:
+            logger.info(f"[{service}] Attempting to connect to database (attempt {attempt + 1}/{max_retries})...")
+            conn = psycopg2.connect(
+                DATABASE_URL,
+                sslmode='require'
+            )
+            conn.autocommit = False
+            logger.info(f"[{service}] Successfully connected to database")
+            return conn
+        except Exception as e:
+            logger.error(f"[{service}] Database connection failed (attempt {attempt + 1}/{max_retries}): {str(e)}")
+            if attempt < max_retries - 1:
+                logger.info(f"[{service}] Retrying in {retry_delay} seconds...")
+                time.sleep(retry_delay)
+            else:
+                logger.error(f"[{service}] Max retries reached. Could not connect to database.")
+                raise
@@ -0,0 +1,154 @@
+import threading
+import time
+import logging
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+# Errors after which a connection can no longer be trusted
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class ConnectionPool:
+    """Thread-safe pool of long-lived database connections.
+
+    Connections come from the `connect` callable (which owns the retry
+    policy), are health checked on checkout when they have been idle for
+    longer than `health_check_interval` seconds, and are thrown away and
+    replaced when they turn out to be broken.
+    """
+
+    def __init__(self, connect, minconn=1, maxconn=5, health_check_interval=30.0, checkout_timeout=30.0):
+        if minconn > maxconn:
+            raise ValueError("minconn cannot be larger than maxconn")
+        self._connect = connect
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._opened = False
+        self.created = 0
+        self.discarded = 0
+
+    def open(self):
+        """Create the minimum number of connections up front"""
+        with self._lock:
+            if self._opened:
+                return
+            self._opened = True
+        for _ in range(self.minconn):
+            conn = self._new_connection()
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+
+    def _new_connection(self):
+        conn = self._connect()
+        self.created += 1
+        return conn
+
+    def _is_healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except CONNECTION_ERRORS:
+            return False
+
+    def _discard(self, conn):
+        self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self):
+        if not self._opened:
+            self.open()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise TimeoutError(f"No database connection available within {self.checkout_timeout}s")
+        try:
+            while True:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    return self._new_connection()
+                conn, idle_since = entry
+                if self._is_healthy(conn, idle_since):
+                    return conn
+                logger.warning("[DB POOL] Dropping broken connection")
+                self._discard(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, broken=False):
+        try:
+            if broken or conn.closed:
+                self._discard(conn)
+                return
+            if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        except CONNECTION_ERRORS:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Check a connection out for the duration of a with block"""
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except CONNECTION_ERRORS:
+            broken = True
+            raise
+        except Exception:
+            try:
+                if not conn.closed:
+                    conn.rollback()
+            except CONNECTION_ERRORS:
+                broken = True
+            raise
+        finally:
+            self.putconn(conn, broken=broken)
+
+    def run(self, operation, retries=1):
+        """Call operation(conn) on a pooled connection, retrying on a fresh one if the connection drops"""
+        for attempt in range(retries + 1):
+            try:
+                with self.connection() as conn:
+                    return operation(conn)
+            except CONNECTION_ERRORS as e:
+                if attempt == retries:
+                    raise
+                logger.warning(f"[DB POOL] Connection lost ({e}), retrying on a new connection...")
+
+    def closeall(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._opened = False
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'idle': len(self._idle),
+                'minconn': self.minconn,
+                'maxconn': self.maxconn,
+                'created': self.created,
+                'discarded': self.discarded,
+            }
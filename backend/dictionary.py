@@ -8,6 +8,8 @@ class QueueName(str, Enum):
     PROCESS = "process_queue"
     AI_MODEL = "ai_model_queue"
     UPLOAD = "upload_queue"
+    # Dataset loads, kept apart so they do not hold up prediction writes
+    UPLOAD_BULK = "upload_bulk_queue"
 
 class Exchange(str, Enum):
     ADD_DIRECT = "add_direct"
@@ -16,14 +18,19 @@ class Exchange(str, Enum):
 class Action(str, Enum):
     # Producer to Uploader
     PRODUCER_UPLOADER_SEND_RAW = "producer_uploader_sendRawData"
+    PRODUCER_UPLOADER_SEND_RAW_BATCH = "producer_uploader_sendRawBatch"
+    PRODUCER_UPLOADER_RAW_COMPLETE = "producer_uploader_rawComplete"
     # Producer to Processor
     PRODUCER_PROCESSOR_SEND_RAW = "producer_processor_sendRawData"
+    PRODUCER_PROCESSOR_SEND_RAW_BATCH = "producer_processor_sendRawBatch"
+    PRODUCER_PROCESSOR_RAW_COMPLETE = "producer_processor_rawComplete"
     # Processor to Uploader
     PROCESSOR_UPLOADER_UPLOAD_CLEANED = "processor_uploader_upload_cleaned"
     # Processor to Aimodel
     PROCESSOR_AIMODEL_TRAIN_MODEL = "processor_aimodel_trainmodel"
     # Aimodel to Uploader
     AIMODEL_UPLOADER_UPLOAD_PREDICTION = "aimodel_uploader_uploadprediction"
+    AIMODEL_UPLOADER_UPLOAD_PREDICTION_BATCH = "aimodel_uploader_uploadpredictionbatch"
 
 class EnvVar(str, Enum):
     RABBITMQ_HOST = "RABBITMQ_HOST"
@@ -48,6 +55,8 @@ class DataColumn(str, Enum):
     LAST_UPDATED = "Last Updated"
     CURRENT_VER = "Current Ver"
     ANDROID_VER = "Android Ver"
+    ROW_KEY = "Row Key"
+    ROW_HASH = "Row Hash"
     FILE_PATH = "file_path" 
 
 class DbColumn(str, Enum):
@@ -65,6 +74,9 @@ class DbColumn(str, Enum):
     LAST_UPDATED = "last_updated"
     CURRENT_VER = "current_ver"
     ANDROID_VER = "android_ver"
+    # Delta ingestion bookkeeping
+    ROW_KEY = "row_key"
+    ROW_HASH = "row_hash"
 
 class PredictionColumn(str, Enum):
     CATEGORY = "category"
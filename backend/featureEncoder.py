@@ -0,0 +1,210 @@
+import ast
+import re
+import numpy as np
+from scipy import sparse
+from .dictionary import DataColumn, PredictionColumn
+
+NUMERIC_FEATURES = [DataColumn.SIZE.value, DataColumn.PRICE.value]
+CATEGORICAL_FEATURES = [
+    DataColumn.CATEGORY.value,
+    DataColumn.TYPE.value,
+    DataColumn.CONTENT_RATING.value,
+    DataColumn.GENRES.value,
+]
+# Categorical features where a row can hold several values at once
+MULTI_HOT_FEATURES = [DataColumn.GENRES.value]
+# Lookup table combinations hold this many column slots per multi-hot feature
+MULTI_HOT_COMBO_SLOTS = 2
+
+# Request field -> training column
+INPUT_FIELDS = {
+    PredictionColumn.CATEGORY.value: DataColumn.CATEGORY.value,
+    PredictionColumn.SIZE.value: DataColumn.SIZE.value,
+    PredictionColumn.TYPE.value: DataColumn.TYPE.value,
+    PredictionColumn.PRICE.value: DataColumn.PRICE.value,
+    PredictionColumn.CONTENT_RATING.value: DataColumn.CONTENT_RATING.value,
+    PredictionColumn.GENRES.value: DataColumn.GENRES.value,
+}
+
+_SIZE_PATTERN = re.compile(r'^\s*([0-9][0-9,]*\.?[0-9]*)\s*([MmKk]?)\+?\s*$')
+
+
+def parse_genres(value):
+    """Turn any accepted genre representation into a tuple of genre names.
+
+    Accepts the raw dataset form ('Art & Design;Pretend Play'), the cleaned
+    CSV form ("['Art & Design', 'Pretend Play']") and real lists.
+    """
+    if value is None:
+        return ()
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return tuple(str(genre).strip() for genre in value)
+    value = str(value).strip()
+    if value.startswith('['):
+        try:
+            return tuple(str(genre).strip() for genre in ast.literal_eval(value))
+        except (ValueError, SyntaxError):
+            pass
+    return tuple(genre.strip() for genre in value.split(';') if genre.strip())
+
+
+def parse_size(value, fill_value=np.nan):
+    """Convert a request app size ('20', '20M', '512k') to MB like processor.clean_size"""
+    if value is None:
+        return fill_value
+    if isinstance(value, (int, float, np.number)):
+        return float(value) if not np.isnan(value) else fill_value
+    if str(value).strip() == 'Varies with device':
+        return fill_value
+    match = _SIZE_PATTERN.match(str(value))
+    if match is None:
+        raise ValueError(f"Invalid app size: {value!r}")
+    size = float(match.group(1).replace(',', ''))
+    if match.group(2).lower() == 'k':
+        size = size / 1024
+    return size
+
+
+class FeatureEncoder:
+    """Maps prediction inputs straight onto the training design matrix columns.
+
+    Built once from the one-hot `feature_columns` produced at training time
+    and pickled into the model artifact, so inference never needs pandas.
+    Columns of a `multi_hot` feature stand for single values (one per
+    genre) and a row sets every one it holds; otherwise each column stands
+    for a whole value, as in artifacts trained on the stringified genre list.
+    """
+
+    # Artifacts pickled before multi-hot encoding existed have none
+    multi_hot = frozenset()
+
+    def __init__(self, feature_columns, size_fill=np.nan, multi_hot=()):
+        self.feature_columns = list(feature_columns)
+        self.n_features = len(self.feature_columns)
+        self.size_fill = size_fill
+        self.multi_hot = frozenset(multi_hot)
+        self.numeric_index = {}
+        self.category_index = {column: {} for column in CATEGORICAL_FEATURES}
+
+        for idx, column in enumerate(self.feature_columns):
+            if column in NUMERIC_FEATURES:
+                self.numeric_index[column] = idx
+                continue
+            for prefix in CATEGORICAL_FEATURES:
+                if column.startswith(prefix + '_'):
+                    value = column[len(prefix) + 1:]
+                    if prefix == DataColumn.GENRES.value and prefix not in self.multi_hot:
+                        value = parse_genres(value)
+                    self.category_index[prefix][value] = idx
+                    break
+
+    def category_key(self, column, value):
+        """Canonical lookup key for a categorical input value"""
+        if column in self.multi_hot:
+            return tuple(sorted(set(parse_genres(value))))
+        if column == DataColumn.GENRES.value:
+            return parse_genres(value)
+        return str(value).strip()
+
+    def category_indices(self, input_data):
+        """One-hot column index per categorical feature (-1 when unseen in training).
+
+        A multi-hot feature takes MULTI_HOT_COMBO_SLOTS entries, its known
+        column indices in ascending order padded with -1; a row holding more
+        values than that gets a longer tuple, which no lookup table has.
+        """
+        indices = []
+        for field, column in INPUT_FIELDS.items():
+            if column not in self.category_index:
+                continue
+            lookup = self.category_index[column]
+            key = self.category_key(column, input_data[field])
+            if column in self.multi_hot:
+                known = sorted(lookup[value] for value in key if value in lookup)
+                indices.extend(known + [-1] * (MULTI_HOT_COMBO_SLOTS - len(known)))
+            else:
+                indices.append(lookup.get(key, -1))
+        return tuple(indices)
+
+    def canonical_key(self, input_data):
+        """Hashable, normalised form of a request, used as the prediction cache key"""
+        size = parse_size(input_data[PredictionColumn.SIZE.value], self.size_fill)
+        return (
+            self.category_key(DataColumn.CATEGORY.value, input_data[PredictionColumn.CATEGORY.value]),
+            None if np.isnan(size) else size,
+            self.category_key(DataColumn.TYPE.value, input_data[PredictionColumn.TYPE.value]),
+            float(input_data[PredictionColumn.PRICE.value]),
+            self.category_key(DataColumn.CONTENT_RATING.value, input_data[PredictionColumn.CONTENT_RATING.value]),
+            self.category_key(DataColumn.GENRES.value, input_data[PredictionColumn.GENRES.value]),
+        )
+
+    def encode(self, input_data, out=None):
+        """Encode one request dict into a float32 row, reusing `out` if given"""
+        if out is None:
+            out = np.zeros(self.n_features, dtype=np.float32)
+        else:
+            out.fill(0)
+
+        size_idx = self.numeric_index.get(DataColumn.SIZE.value)
+        if size_idx is not None:
+            out[size_idx] = parse_size(input_data[PredictionColumn.SIZE.value], self.size_fill)
+        price_idx = self.numeric_index.get(DataColumn.PRICE.value)
+        if price_idx is not None:
+            out[price_idx] = float(input_data[PredictionColumn.PRICE.value])
+
+        for field, column in INPUT_FIELDS.items():
+            if column not in self.category_index:
+                continue
+            lookup = self.category_index[column]
+            key = self.category_key(column, input_data[field])
+            # Values never seen in training leave the whole group at zero
+            for value in (key if column in self.multi_hot else (key,)):
+                idx = lookup.get(value)
+                if idx is not None:
+                    out[idx] = 1.0
+        return out
+
+    def encode_batch(self, inputs):
+        """Encode a list of request dicts into one float32 CSR matrix, column by column"""
+        n_rows = len(inputs)
+        rows, cols, values = [], [], []
+
+        for column, field, parse in (
+            (DataColumn.SIZE.value, PredictionColumn.SIZE.value, lambda value: parse_size(value, self.size_fill)),
+            (DataColumn.PRICE.value, PredictionColumn.PRICE.value, float),
+        ):
+            idx = self.numeric_index.get(column)
+            if idx is None:
+                continue
+            rows.append(np.arange(n_rows))
+            cols.append(np.full(n_rows, idx))
+            values.append(np.fromiter((parse(item[field]) for item in inputs), dtype=np.float32, count=n_rows))
+
+        for field, column in INPUT_FIELDS.items():
+            if column not in self.category_index:
+                continue
+            lookup = self.category_index[column]
+            hot = [
+                (row, lookup[value])
+                for row, item in enumerate(inputs)
+                for value in (
+                    self.category_key(column, item[field]) if column in self.multi_hot
+                    else (self.category_key(column, item[field]),)
+                )
+                if value in lookup
+            ]
+            if hot:
+                hot = np.asarray(hot, dtype=np.intp)
+                rows.append(hot[:, 0])
+                cols.append(hot[:, 1])
+                values.append(np.ones(len(hot), dtype=np.float32))
+
+        if not rows:
+            return sparse.csr_matrix((n_rows, self.n_features), dtype=np.float32)
+        matrix = sparse.csr_matrix(
+            (np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(n_rows, self.n_features), dtype=np.float32
+        )
+        # A price of 0 is the common case and needs no stored entry
+        matrix.eliminate_zeros()
+        return matrix
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+from scipy import sparse
+
+FEATURE_STORE_DIR = os.getenv('FEATURE_STORE_DIR', './data/feature_store')
+# Encoded dataset versions kept on disk, the least recently used ones are evicted first
+FEATURE_STORE_MAX_ENTRIES = int(os.getenv('FEATURE_STORE_MAX_ENTRIES', 3))
+FEATURE_STORE_ENABLED = os.getenv('FEATURE_STORE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+X_FILE = 'X.npy'
+Y_FILE = 'y.npy'
+# A CSR design matrix is kept as its three arrays
+CSR_FILES = ('X.data.npy', 'X.indices.npy', 'X.indptr.npy')
+META_FILE = 'meta.json'
+HASH_BLOCK_BYTES = 1 << 20
+
+
+def _hash_file(digest, path):
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b''):
+            digest.update(block)
+
+
+def dataset_hash(path):
+    """Content hash of a CSV file or of every file of a columnar artifact"""
+    digest = hashlib.blake2b(digest_size=16)
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                digest.update(os.path.relpath(file_path, path).encode('utf-8'))
+                _hash_file(digest, file_path)
+    else:
+        _hash_file(digest, path)
+    return digest.hexdigest()
+
+
+def cache_key(data_hash, spec):
+    """Key of one encoded dataset: the data it came from and how it was encoded"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(data_hash.encode('utf-8'))
+    digest.update(json.dumps(spec, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class EncodedDataset:
+    """Design matrix, targets and column vocabulary of one cached dataset version"""
+
+    def __init__(self, X, y, feature_columns, target_columns, key=None, hit=False):
+        self.X = X
+        self.y = y
+        self.feature_columns = feature_columns
+        self.target_columns = target_columns
+        self.key = key
+        self.hit = hit
+
+
+class FeatureStore:
+    """On-disk cache of encoded training matrices.
+
+    Entries are keyed by a hash of the cleaned dataset and of the encoding
+    spec, so a new dataset or a changed encoding gets a new entry. X and y
+    are kept as .npy files and memory-mapped on a hit, the column
+    vocabulary sits in meta.json. A sparse X is stored as its CSR arrays,
+    each memory-mapped on its own. Entries are written to a temp directory
+    and renamed into place; past `max_entries` the least recently used
+    entries are removed.
+    """
+
+    def __init__(self, root=None, max_entries=None):
+        self.root = root or FEATURE_STORE_DIR
+        self.max_entries = FEATURE_STORE_MAX_ENTRIES if max_entries is None else max_entries
+
+    def _entry(self, key):
+        return os.path.join(self.root, key)
+
+    def get(self, key):
+        entry = self._entry(key)
+        try:
+            with open(os.path.join(entry, META_FILE)) as f:
+                meta = json.load(f)
+            if meta.get('X_format') == 'csr':
+                arrays = [np.load(os.path.join(entry, name), mmap_mode='r') for name in CSR_FILES]
+                X = sparse.csr_matrix(tuple(arrays), shape=tuple(meta['X_shape']), copy=False)
+            else:
+                X = np.load(os.path.join(entry, X_FILE), mmap_mode='r')
+            y = np.load(os.path.join(entry, Y_FILE), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        # The entry's mtime is its last use, which is what eviction goes by
+        os.utime(entry)
+        return EncodedDataset(X, y, meta['feature_columns'], meta['target_columns'], key=key, hit=True)
+
+    def put(self, key, X, y, feature_columns, target_columns, meta=None):
+        os.makedirs(self.root, exist_ok=True)
+        temp_dir = tempfile.mkdtemp(dir=self.root, prefix='.tmp-')
+        meta = dict(meta or {}, feature_columns=list(feature_columns),
+                    target_columns=list(target_columns), created_at=time.time())
+        try:
+            if sparse.issparse(X):
+                X = sparse.csr_matrix(X)
+                for name, array in zip(CSR_FILES, (X.data, X.indices, X.indptr)):
+                    np.save(os.path.join(temp_dir, name), array)
+                meta.update(X_format='csr', X_shape=list(X.shape))
+            else:
+                np.save(os.path.join(temp_dir, X_FILE), np.ascontiguousarray(X))
+            np.save(os.path.join(temp_dir, Y_FILE), np.ascontiguousarray(y))
+            with open(os.path.join(temp_dir, META_FILE), 'w') as f:
+                json.dump(meta, f)
+            try:
+                os.rename(temp_dir, self._entry(key))
+            except OSError:
+                # Another run stored the same entry first, keep that one
+                shutil.rmtree(temp_dir, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+        self.evict()
+        return self.get(key)
+
+    def entries(self):
+        """(key, last used) of every entry, most recently used first"""
+        if not os.path.isdir(self.root):
+            return []
+        entries = [
+            (name, os.path.getmtime(os.path.join(self.root, name)))
+            for name in os.listdir(self.root)
+            if not name.startswith('.') and os.path.isdir(os.path.join(self.root, name))
+        ]
+        return sorted(entries, key=lambda entry: entry[1], reverse=True)
+
+    def evict(self):
+        removed = []
+        for key, _ in self.entries()[self.max_entries:]:
+            shutil.rmtree(self._entry(key), ignore_errors=True)
+            removed.append(key)
+        return removed
+
+    def load_or_build(self, data_path, spec, build):
+        """Return the cached encoding of data_path, building it with build() -> (X, y, feature_columns, target_columns) on a miss"""
+        key = cache_key(dataset_hash(data_path), spec)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        X, y, feature_columns, target_columns = build()
+        stored = self.put(key, X, y, feature_columns, target_columns, meta={'data_path': data_path, 'spec': spec})
+        if stored is None:
+            return EncodedDataset(X, y, feature_columns, target_columns, key=key)
+        stored.hit = False
+        return stored
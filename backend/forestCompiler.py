@@ -0,0 +1,159 @@
+import numpy as np
+from scipy import sparse
+
+# Rows are traversed in chunks so the (rows x trees) node index matrix stays small
+PREDICT_CHUNK_ROWS = 2048
+
+
+def _forest_groups(model):
+    """Yield (trees, output_indices) for every forest inside the model"""
+    if hasattr(model, 'estimators_') and hasattr(model, 'n_outputs_') and hasattr(model.estimators_[0], 'tree_'):
+        # A native forest, possibly multi-output
+        yield model.estimators_, list(range(model.n_outputs_))
+        return
+    if hasattr(model, 'estimators_'):
+        # MultiOutputRegressor, one forest per target
+        start = 0
+        for forest in model.estimators_:
+            if not hasattr(forest, 'estimators_') or not hasattr(forest.estimators_[0], 'tree_'):
+                raise TypeError(f"Cannot compile estimator {type(forest).__name__}")
+            n_outputs = getattr(forest, 'n_outputs_', 1)
+            yield forest.estimators_, list(range(start, start + n_outputs))
+            start += n_outputs
+        return
+    raise TypeError(f"Cannot compile model {type(model).__name__}")
+
+
+class CompiledForest:
+    """Every tree of a (multi-output) random forest flattened into contiguous arrays.
+
+    All trees live in one node table and every (row, tree) pair is walked
+    in lockstep with vectorised NumPy steps; pairs drop out as soon as they
+    reach a leaf. Predictions match sklearn's, which also compares float32
+    features against float64 thresholds.
+    """
+
+    def __init__(self, feature, threshold, left, right, missing_left, roots, max_depth, groups, n_outputs, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.missing_left = missing_left
+        self.roots = roots
+        # Leaves point back to themselves
+        self.is_leaf = left == np.arange(len(left), dtype=np.int32)
+        self.max_depth = max_depth
+        # (tree_slice, node_offset, value, output_indices) per forest
+        self.groups = groups
+        self.n_outputs = n_outputs
+        self.n_features = n_features
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def nbytes(self):
+        arrays = [self.feature, self.threshold, self.left, self.right, self.roots, self.is_leaf]
+        if self.missing_left is not None:
+            arrays.append(self.missing_left)
+        return sum(a.nbytes for a in arrays) + sum(g[2].nbytes for g in self.groups)
+
+    def _leaves(self, X):
+        n_rows = X.shape[0]
+        nodes = np.tile(self.roots, n_rows)
+        # Offset of each pair's row in the flattened feature matrix
+        row_offsets = np.repeat(np.arange(n_rows, dtype=np.int64) * X.shape[1], self.n_trees)
+        flat_X = np.ascontiguousarray(X).ravel()
+        has_missing = self.missing_left is not None and np.isnan(X).any()
+        is_leaf = self.is_leaf
+        # Only (row, tree) pairs that have not reached a leaf are advanced each step
+        active = np.flatnonzero(~is_leaf[nodes])
+        while active.size:
+            current = nodes.take(active)
+            values = flat_X.take(row_offsets.take(active) + self.feature.take(current))
+            go_left = values <= self.threshold.take(current)
+            if has_missing:
+                go_left = np.where(np.isnan(values), self.missing_left.take(current), go_left)
+            current = np.where(go_left, self.left.take(current), self.right.take(current))
+            nodes[active] = current
+            active = active[~is_leaf.take(current)]
+        return nodes.reshape(n_rows, self.n_trees)
+
+    def predict(self, X):
+        if sparse.issparse(X):
+            # Densified a chunk at a time, the traversal reads features by flat offset
+            X = sparse.csr_matrix(X)
+        else:
+            X = np.asarray(X, dtype=np.float32)
+            if X.ndim == 1:
+                X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+
+        out = np.empty((X.shape[0], self.n_outputs), dtype=np.float64)
+        for start in range(0, X.shape[0], PREDICT_CHUNK_ROWS):
+            chunk = X[start:start + PREDICT_CHUNK_ROWS]
+            if sparse.issparse(chunk):
+                chunk = chunk.toarray().astype(np.float32, copy=False)
+            leaves = self._leaves(chunk)
+            for tree_slice, node_offset, value, outputs in self.groups:
+                out[start:start + chunk.shape[0], outputs] = value[leaves[:, tree_slice] - node_offset].mean(axis=1)
+        return out
+
+
+def compile_forest(model):
+    """Flatten a RandomForestRegressor or MultiOutputRegressor of forests into a CompiledForest"""
+    features, thresholds, lefts, rights, missing, roots, groups = [], [], [], [], [], [], []
+    node_count = 0
+    tree_count = 0
+    max_depth = 0
+    n_outputs = 0
+    n_features = None
+    track_missing = True
+
+    for trees, outputs in _forest_groups(model):
+        group_start_node = node_count
+        group_start_tree = tree_count
+        values = []
+        for estimator in trees:
+            tree = estimator.tree_
+            n_features = tree.n_features if n_features is None else n_features
+            is_leaf = tree.children_left == -1
+            own_index = np.arange(tree.node_count, dtype=np.int32) + node_count
+
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold).astype(np.float64))
+            lefts.append(np.where(is_leaf, own_index, tree.children_left + node_count).astype(np.int32))
+            rights.append(np.where(is_leaf, own_index, tree.children_right + node_count).astype(np.int32))
+            if hasattr(tree, 'missing_go_to_left'):
+                missing.append(np.asarray(tree.missing_go_to_left, dtype=bool))
+            else:
+                track_missing = False
+            values.append(tree.value.reshape(tree.node_count, -1))
+            roots.append(node_count)
+
+            max_depth = max(max_depth, tree.max_depth)
+            node_count += tree.node_count
+            tree_count += 1
+
+        groups.append((
+            slice(group_start_tree, tree_count),
+            group_start_node,
+            np.concatenate(values).astype(np.float64),
+            outputs,
+        ))
+        n_outputs = max(n_outputs, max(outputs) + 1)
+
+    return CompiledForest(
+        feature=np.concatenate(features),
+        threshold=np.concatenate(thresholds),
+        left=np.concatenate(lefts),
+        right=np.concatenate(rights),
+        missing_left=np.concatenate(missing) if track_missing else None,
+        roots=np.asarray(roots, dtype=np.int32),
+        max_depth=max_depth,
+        groups=groups,
+        n_outputs=n_outputs,
+        n_features=n_features,
+    )
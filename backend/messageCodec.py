@@ -0,0 +1,186 @@
+import os
+import json
+import zlib
+import struct
+from backend.dictionary import Action, PredictionColumn
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Every pipeline message is [header][payload]. The header is the magic bytes,
+# the envelope version and a flags byte holding the payload codec and
+# whether the payload is zlib-compressed. The payload is [action code, body].
+MAGIC = b'\xadM'
+ENVELOPE_VERSION = 1
+HEADER = struct.Struct('>2sBB')
+
+CODEC_JSON = 0
+CODEC_MSGPACK = 1
+CODEC_MASK = 0x03
+FLAG_ZLIB = 0x04
+
+# msgpack when it is installed, json otherwise; decoding handles both
+MESSAGE_CODEC = os.getenv('MESSAGE_CODEC', 'auto')
+# Payloads at least this large are compressed (row and prediction batches), 0 disables it
+MESSAGE_COMPRESS_MIN_BYTES = int(os.getenv('MESSAGE_COMPRESS_MIN_BYTES', 4096))
+MESSAGE_COMPRESS_LEVEL = int(os.getenv('MESSAGE_COMPRESS_LEVEL', 1))
+
+# Wire codes are fixed once assigned; new actions get new numbers at the end
+ACTION_CODES = {
+    Action.PRODUCER_UPLOADER_SEND_RAW.value: 1,
+    Action.PRODUCER_PROCESSOR_SEND_RAW.value: 2,
+    Action.PROCESSOR_UPLOADER_UPLOAD_CLEANED.value: 3,
+    Action.PROCESSOR_AIMODEL_TRAIN_MODEL.value: 4,
+    Action.AIMODEL_UPLOADER_UPLOAD_PREDICTION.value: 5,
+    Action.AIMODEL_UPLOADER_UPLOAD_PREDICTION_BATCH.value: 6,
+    Action.PRODUCER_UPLOADER_SEND_RAW_BATCH.value: 7,
+    Action.PRODUCER_UPLOADER_RAW_COMPLETE.value: 8,
+    Action.PRODUCER_PROCESSOR_SEND_RAW_BATCH.value: 9,
+    Action.PRODUCER_PROCESSOR_RAW_COMPLETE.value: 10,
+}
+ACTIONS_BY_CODE = {code: action for action, code in ACTION_CODES.items()}
+UNKNOWN_ACTION = 0
+
+# Predictions travel as positional lists instead of repeating every key name
+PREDICTION_INPUT_FIELDS = [
+    PredictionColumn.CATEGORY.value, PredictionColumn.SIZE.value, PredictionColumn.TYPE.value,
+    PredictionColumn.PRICE.value, PredictionColumn.CONTENT_RATING.value, PredictionColumn.GENRES.value,
+]
+PREDICTION_OUTPUT_FIELDS = [
+    PredictionColumn.RATING.value, PredictionColumn.INSTALLS.value, PredictionColumn.REVIEWS.value,
+]
+
+
+class MessageDecodeError(ValueError):
+    pass
+
+
+def pack_prediction(prediction_data):
+    inputs = prediction_data['Input Features']
+    outputs = prediction_data['Predictions']
+    extra = {key: value for key, value in inputs.items() if key not in PREDICTION_INPUT_FIELDS}
+    return [
+        [inputs.get(field) for field in PREDICTION_INPUT_FIELDS],
+        [outputs.get(field) for field in PREDICTION_OUTPUT_FIELDS],
+        extra or None,
+    ]
+
+
+def unpack_prediction(packed):
+    inputs, outputs, extra = packed
+    input_features = dict(zip(PREDICTION_INPUT_FIELDS, inputs))
+    if extra:
+        input_features.update(extra)
+    return {
+        'Input Features': input_features,
+        'Predictions': dict(zip(PREDICTION_OUTPUT_FIELDS, outputs)),
+    }
+
+
+# Per action, the body field that gets a compact representation
+BODY_PACKERS = {
+    Action.AIMODEL_UPLOADER_UPLOAD_PREDICTION.value: (
+        'prediction_data', pack_prediction, unpack_prediction,
+    ),
+    Action.AIMODEL_UPLOADER_UPLOAD_PREDICTION_BATCH.value: (
+        'predictions',
+        lambda predictions: [pack_prediction(p) for p in predictions],
+        lambda packed: [unpack_prediction(p) for p in packed],
+    ),
+}
+
+
+def _codec(codec=None):
+    codec = codec or MESSAGE_CODEC
+    if codec == 'auto':
+        return CODEC_MSGPACK if msgpack is not None else CODEC_JSON
+    if codec == 'msgpack':
+        if msgpack is None:
+            raise ImportError("msgpack is required for the msgpack message codec")
+        return CODEC_MSGPACK
+    if codec == 'json':
+        return CODEC_JSON
+    raise ValueError(f"Unknown message codec: {codec}")
+
+
+def _dumps(payload, codec):
+    if codec == CODEC_MSGPACK:
+        return msgpack.packb(payload, use_bin_type=True)
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+def _loads(data, codec):
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise MessageDecodeError("Message is msgpack encoded but msgpack is not installed")
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+    if codec == CODEC_JSON:
+        return json.loads(data)
+    raise MessageDecodeError(f"Unknown payload codec {codec}")
+
+
+def encode(message, codec=None, compress_min_bytes=None):
+    """Encode a message dict with an 'action' key into an envelope"""
+    codec = _codec(codec)
+    compress_min_bytes = MESSAGE_COMPRESS_MIN_BYTES if compress_min_bytes is None else compress_min_bytes
+    body = dict(message)
+    action = body.get('action')
+    code = ACTION_CODES.get(action, UNKNOWN_ACTION)
+    if code != UNKNOWN_ACTION:
+        del body['action']
+    if action in BODY_PACKERS:
+        field, pack, _ = BODY_PACKERS[action]
+        if field in body:
+            body[field] = pack(body[field])
+
+    payload = _dumps([code, body], codec)
+    flags = codec
+    if compress_min_bytes and len(payload) >= compress_min_bytes:
+        payload = zlib.compress(payload, MESSAGE_COMPRESS_LEVEL)
+        flags |= FLAG_ZLIB
+    return HEADER.pack(MAGIC, ENVELOPE_VERSION, flags) + payload
+
+
+def _legacy_decode(body):
+    """Plain JSON messages sent before the envelope existed"""
+    try:
+        message = json.loads(body)
+    except ValueError as e:
+        raise MessageDecodeError(f"Message is neither an envelope nor JSON: {e}")
+    if isinstance(message, dict) and 'action' not in message:
+        # The producer used to key the action by the enum member name
+        for member in Action:
+            if member.name.lower() in message:
+                message['action'] = message.pop(member.name.lower())
+                break
+    return message
+
+
+def decode(body):
+    """Decode an envelope (or a legacy JSON message) back into a message dict"""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if not body.startswith(MAGIC):
+        return _legacy_decode(body)
+    if len(body) < HEADER.size:
+        raise MessageDecodeError("Truncated message envelope")
+    _, version, flags = HEADER.unpack_from(body)
+    if version > ENVELOPE_VERSION:
+        raise MessageDecodeError(f"Message envelope version {version} is newer than {ENVELOPE_VERSION}")
+    payload = body[HEADER.size:]
+    if flags & FLAG_ZLIB:
+        payload = zlib.decompress(payload)
+    code, message = _loads(payload, flags & CODEC_MASK)
+
+    if code != UNKNOWN_ACTION:
+        if code not in ACTIONS_BY_CODE:
+            raise MessageDecodeError(f"Unknown action code {code}")
+        message['action'] = ACTIONS_BY_CODE[code]
+    action = message.get('action')
+    if action in BODY_PACKERS:
+        field, _, unpack = BODY_PACKERS[action]
+        if field in message:
+            message[field] = unpack(message[field])
+    return message
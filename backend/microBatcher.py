@@ -0,0 +1,140 @@
+import threading
+import queue
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+QUEUE_WAIT_MS_BUCKETS = [0.5, 1, 2, 5, 10, 25, 50, 100, 250]
+
+
+class Histogram:
+    """Cumulative bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+            else:
+                self._counts[-1] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        with self._lock:
+            cumulative = 0
+            buckets = {}
+            for bound, count in zip(self.buckets + ['+Inf'], self._counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            return {'buckets': buckets, 'sum': self._sum, 'count': self._count}
+
+
+class _PendingPrediction:
+    __slots__ = ('loaded', 'features', 'enqueued_at', 'done', 'result', 'error')
+
+    def __init__(self, loaded, features):
+        self.loaded = loaded
+        self.features = features
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row predictions into one model call.
+
+    Request threads submit an encoded row and block; a single worker thread
+    waits up to `max_wait_ms` for more rows (or until `max_batch_size` is
+    reached), stacks them and calls `predict_fn(loaded, matrix)` once per
+    model version present in the batch.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait_ms=5.0, result_timeout=30.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.result_timeout = result_timeout
+        self.batch_size_histogram = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_histogram = Histogram(QUEUE_WAIT_MS_BUCKETS)
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='predict-microbatcher', daemon=True)
+                self._worker.start()
+
+    def submit(self, loaded, features):
+        """Queue one encoded row and block until its prediction is ready"""
+        self.start()
+        pending = _PendingPrediction(loaded, features)
+        self._queue.put(pending)
+        if not pending.done.wait(self.result_timeout):
+            raise TimeoutError("Timed out waiting for batched prediction")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            dispatched_at = time.perf_counter()
+            self.batch_size_histogram.observe(len(batch))
+            for pending in batch:
+                self.queue_wait_histogram.observe((dispatched_at - pending.enqueued_at) * 1000.0)
+
+            # A hot reload can land mid-batch, rows are only stacked with rows encoded for the same model
+            groups = {}
+            for pending in batch:
+                groups.setdefault(id(pending.loaded), []).append(pending)
+
+            for group in groups.values():
+                try:
+                    matrix = np.vstack([pending.features for pending in group])
+                    predictions = self.predict_fn(group[0].loaded, matrix)
+                    for pending, prediction in zip(group, predictions):
+                        pending.result = prediction
+                except Exception as e:
+                    logger.error(f"[MICROBATCH] Batched prediction failed: {e}")
+                    for pending in group:
+                        pending.error = e
+                finally:
+                    for pending in group:
+                        pending.done.set()
+
+    def metrics(self):
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'queue_depth': self._queue.qsize(),
+            'batch_size': self.batch_size_histogram.snapshot(),
+            'queue_wait_ms': self.queue_wait_histogram.snapshot(),
+        }
@@ -0,0 +1,67 @@
+import os
+from scipy import sparse
+from sklearn.ensemble import RandomForestRegressor, HistGradientBoostingRegressor
+from sklearn.multioutput import MultiOutputRegressor
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import FunctionTransformer
+
+# Estimator trained by aimodelTrain, one of BACKENDS
+MODEL_BACKEND = os.getenv('MODEL_BACKEND', 'forest')
+FOREST_TREES = int(os.getenv('FOREST_TREES', 300))
+CAPPED_FOREST_MAX_DEPTH = int(os.getenv('CAPPED_FOREST_MAX_DEPTH', 16))
+CAPPED_FOREST_MIN_SAMPLES_LEAF = int(os.getenv('CAPPED_FOREST_MIN_SAMPLES_LEAF', 5))
+HGB_MAX_ITER = int(os.getenv('HGB_MAX_ITER', 300))
+HGB_LEARNING_RATE = float(os.getenv('HGB_LEARNING_RATE', 0.1))
+
+
+def to_dense(X):
+    """HistGradientBoosting takes dense input only; module level so the pipeline pickles"""
+    return X.toarray() if sparse.issparse(X) else X
+
+
+def forest():
+    """One full-depth forest per target (the original model)"""
+    return MultiOutputRegressor(RandomForestRegressor(n_estimators=FOREST_TREES, random_state=42, n_jobs=-1))
+
+
+def multi_output_forest():
+    """A single forest whose trees predict every target at once"""
+    return RandomForestRegressor(n_estimators=FOREST_TREES, random_state=42, n_jobs=-1)
+
+
+def capped_forest():
+    """Per-target forests with bounded depth and leaf size, for a smaller artifact and faster traversal"""
+    return MultiOutputRegressor(RandomForestRegressor(
+        n_estimators=FOREST_TREES, max_depth=CAPPED_FOREST_MAX_DEPTH,
+        min_samples_leaf=CAPPED_FOREST_MIN_SAMPLES_LEAF, random_state=42, n_jobs=-1,
+    ))
+
+
+def hist_gradient_boosting():
+    """One histogram gradient boosting model per target"""
+    return make_pipeline(
+        FunctionTransformer(to_dense, accept_sparse=True),
+        MultiOutputRegressor(HistGradientBoostingRegressor(
+            max_iter=HGB_MAX_ITER, learning_rate=HGB_LEARNING_RATE, random_state=42,
+        )),
+    )
+
+
+BACKENDS = {
+    'forest': forest,
+    'multi_output_forest': multi_output_forest,
+    'capped_forest': capped_forest,
+    'hist_gradient_boosting': hist_gradient_boosting,
+}
+
+
+def backend_name(name=None):
+    name = name or MODEL_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown model backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    return name
+
+
+def build_estimator(name=None):
+    """Return an unfitted estimator for a backend name (MODEL_BACKEND by default)"""
+    return BACKENDS[backend_name(name)]()
@@ -0,0 +1,171 @@
+import os
+import pickle
+import threading
+import time
+import logging
+from datetime import datetime
+from .featureEncoder import FeatureEncoder
+from .forestCompiler import compile_forest
+from .predictionTable import table_path, load_prediction_table
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(__file__), 'trained_model.pkl')
+MODEL_RELOAD_INTERVAL = float(os.getenv('MODEL_RELOAD_INTERVAL', 5))
+# auto: compiled engine for small batches, sklearn above COMPILED_ENGINE_MAX_ROWS
+MODEL_ENGINE = os.getenv('MODEL_ENGINE', 'auto')
+COMPILED_ENGINE_MAX_ROWS = int(os.getenv('COMPILED_ENGINE_MAX_ROWS', 32))
+# Opt-in: interpolated table answers only approximate the model, see aimodelTrain.LOOKUP_TABLE_MAX_ERROR
+PREDICT_LOOKUP_TABLE = os.getenv('PREDICT_LOOKUP_TABLE', 'false').lower() in ('1', 'true', 'yes')
+
+
+class LoadedModel:
+    """A trained model artifact held in memory together with its metadata"""
+
+    def __init__(self, model_data, path, signature):
+        self.model = model_data['model']
+        self.feature_columns = model_data['feature_columns']
+        # Artifacts trained before the encoder was saved get one built from their columns
+        self.encoder = model_data.get('encoder') or FeatureEncoder(self.feature_columns)
+        self.compiled = model_data.get('compiled')
+        if self.compiled is None and MODEL_ENGINE != 'sklearn':
+            try:
+                self.compiled = compile_forest(self.model)
+            except TypeError as e:
+                logger.info(f"[MODEL] Serving without compiled engine: {e}")
+        self.path = path
+        self.signature = signature
+        self.version = model_data.get('version') or f"mtime-{signature[0]}"
+        self.trained_at = model_data.get('trained_at')
+        self.backend = model_data.get('backend', 'forest')
+        self.table = None
+        if PREDICT_LOOKUP_TABLE:
+            try:
+                self.table = load_prediction_table(table_path(path), self.version)
+            except Exception as e:
+                logger.error(f"[MODEL] Ignoring unreadable lookup table: {e}")
+        self.loaded_at = datetime.now().isoformat()
+
+    def predict(self, features):
+        """Predict an encoded matrix with the compiled engine or the sklearn model"""
+        use_compiled = self.compiled is not None and (
+            MODEL_ENGINE == 'compiled'
+            or (MODEL_ENGINE == 'auto' and features.shape[0] <= COMPILED_ENGINE_MAX_ROWS)
+        )
+        if use_compiled:
+            return self.compiled.predict(features)
+        return self.model.predict(features)
+
+    def status(self):
+        return {
+            'version': self.version,
+            'backend': self.backend,
+            'engine': MODEL_ENGINE if self.compiled is not None else 'sklearn',
+            'trained_at': self.trained_at,
+            'loaded_at': self.loaded_at,
+            'path': self.path,
+            'feature_count': len(self.feature_columns),
+            'lookup_table': None if self.table is None else {
+                'combinations': len(self.table.combos),
+                'size_grid': self.table.size_grid.tolist(),
+                'price_grid': self.table.price_grid.tolist(),
+            },
+        }
+
+
+def artifact_signature(path):
+    """Return the (mtime_ns, size) pair used to detect a new artifact on disk"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_model_data(path):
+    """Unpickle a model artifact and wrap it in a LoadedModel"""
+    signature = artifact_signature(path)
+    with open(path, 'rb') as f:
+        model_data = pickle.load(f)
+    return LoadedModel(model_data, path, signature)
+
+
+class ModelRegistry:
+    """Process-wide holder of the serving model with background hot reload.
+
+    Requests grab a reference to the current LoadedModel and keep using it
+    for the whole request, so swapping in a new model never affects requests
+    that are already in flight.
+    """
+
+    def __init__(self, model_path=None, poll_interval=None):
+        self.model_path = model_path or DEFAULT_MODEL_PATH
+        self.poll_interval = MODEL_RELOAD_INTERVAL if poll_interval is None else poll_interval
+        self._current = None
+        self._load_lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+        self.last_error = None
+        self.reload_count = 0
+
+    def get(self):
+        """Return the current LoadedModel, loading it on first use"""
+        current = self._current
+        if current is None:
+            self.reload_if_changed()
+            current = self._current
+        return current
+
+    def reload_if_changed(self):
+        """Load the artifact if its signature differs from the serving one"""
+        with self._load_lock:
+            try:
+                signature = artifact_signature(self.model_path)
+            except OSError as e:
+                self.last_error = f"Model artifact not available: {e}"
+                return False
+
+            current = self._current
+            if current is not None and current.signature == signature:
+                return False
+
+            try:
+                start = time.perf_counter()
+                loaded = load_model_data(self.model_path)
+                elapsed = time.perf_counter() - start
+            except Exception as e:
+                self.last_error = f"Error loading model: {e}"
+                logger.error(f"[MODEL] {self.last_error}")
+                return False
+
+            # Single reference assignment, readers see either the old or the new model
+            self._current = loaded
+            self.last_error = None
+            self.reload_count += 1
+            logger.info(f"[MODEL] Loaded model version {loaded.version} in {elapsed:.2f}s")
+            return True
+
+    def start(self):
+        """Start the background thread that watches the artifact for changes"""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name='model-registry-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+
+    def _watch(self):
+        while not self._stop.is_set():
+            self.reload_if_changed()
+            self._stop.wait(self.poll_interval)
+
+    def status(self):
+        current = self._current
+        return {
+            'loaded': current is not None,
+            'model': current.status() if current is not None else None,
+            'reload_count': self.reload_count,
+            'poll_interval': self.poll_interval,
+            'last_error': self.last_error,
+        }
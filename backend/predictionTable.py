@@ -0,0 +1,211 @@
+import os
+import itertools
+import tempfile
+import numpy as np
+from scipy import sparse
+from .dictionary import DataColumn
+from .featureEncoder import CATEGORICAL_FEATURES, MULTI_HOT_COMBO_SLOTS
+
+DEFAULT_SIZE_GRID = [0.0, 1.0, 2.5, 5.0, 10.0, 20.0, 35.0, 50.0, 75.0, 100.0]
+DEFAULT_PRICE_GRID = [0.0, 0.99, 1.99, 2.99, 4.99, 9.99]
+# Rows scored per model.predict call while building the table
+BUILD_CHUNK_ROWS = 50000
+
+
+def table_path(model_path):
+    """Location of the lookup table that belongs to a model artifact"""
+    return os.path.splitext(model_path)[0] + '.lut.npz'
+
+
+class PredictionTable:
+    """Precomputed predictions over categorical combinations x a Size/Price grid.
+
+    Each combination is the tuple of one-hot column indices for Category,
+    Type, Content Rating and Genres (-1 when the value was unknown); a
+    multi-hot Genres takes MULTI_HOT_COMBO_SLOTS of them. Lookups
+    interpolate bilinearly between grid points and return None outside the
+    grid so the caller can fall back to the live model.
+    """
+
+    def __init__(self, version, combos, size_grid, price_grid, values):
+        self.version = version
+        self.combos = np.asarray(combos, dtype=np.int32)
+        self.size_grid = np.asarray(size_grid, dtype=np.float64)
+        self.price_grid = np.asarray(price_grid, dtype=np.float64)
+        self.values = np.asarray(values, dtype=np.float32)
+        self.index = {tuple(int(c) for c in combo): i for i, combo in enumerate(self.combos)}
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.combos.nbytes
+
+    @staticmethod
+    def _position(grid, value):
+        """Return (lower index, weight of the upper point) or None outside the grid"""
+        if not grid[0] <= value <= grid[-1]:
+            return None
+        i = min(int(np.searchsorted(grid, value, side='right')) - 1, len(grid) - 2)
+        return i, (value - grid[i]) / (grid[i + 1] - grid[i])
+
+    def lookup(self, combo, size, price):
+        """Interpolated prediction row for a request, or None when it is off the table"""
+        combo_idx = self.index.get(combo)
+        if combo_idx is None or size is None or np.isnan(size):
+            return None
+        size_pos = self._position(self.size_grid, size)
+        price_pos = self._position(self.price_grid, price)
+        if size_pos is None or price_pos is None:
+            return None
+        i, ts = size_pos
+        j, tp = price_pos
+        cell = self.values[combo_idx, i:i + 2, j:j + 2].astype(np.float64)
+        low = cell[0, 0] * (1 - tp) + cell[0, 1] * tp
+        high = cell[1, 0] * (1 - tp) + cell[1, 1] * tp
+        return low * (1 - ts) + high * ts
+
+
+def _group_columns(encoder):
+    return [sorted(encoder.category_index[column].values()) for column in CATEGORICAL_FEATURES]
+
+
+def _slots(encoder, column):
+    return MULTI_HOT_COMBO_SLOTS if column in encoder.multi_hot else 1
+
+
+def row_combinations(encoder, X):
+    """Categorical combination of every row of an encoded (dense or sparse) matrix.
+
+    Returns the combinations and a mask of the rows a table can hold.
+    """
+    n_rows = X.shape[0]
+    parts = []
+    # Rows with more genres than the multi-hot slots hold are served by the live model
+    fits = np.ones(n_rows, dtype=bool)
+    for column, cols in zip(CATEGORICAL_FEATURES, _group_columns(encoder)):
+        slots = _slots(encoder, column)
+        part = np.full((n_rows, slots), -1, dtype=np.int32)
+        parts.append(part)
+        if not cols:
+            continue
+        block = X[:, cols]
+        hot = (block.toarray() if sparse.issparse(block) else np.asarray(block)) > 0
+        counts = hot.sum(axis=1)
+        fits &= counts <= slots
+        width = min(slots, len(cols))
+        # Hot columns first, each row's in ascending column order
+        order = np.argsort(~hot, axis=1, kind='stable')[:, :width]
+        part[:, :width] = np.where(
+            np.arange(width) < counts[:, None], np.asarray(cols, dtype=np.int32)[order], -1
+        )
+    return np.hstack(parts), fits
+
+
+def observed_combinations(encoder, X):
+    """Categorical combinations present in an encoded training matrix"""
+    combos, fits = row_combinations(encoder, X)
+    return np.unique(combos[fits], axis=0)
+
+
+def _column(X, idx):
+    column = X[:, idx]
+    return (column.toarray() if sparse.issparse(column) else np.asarray(column)).ravel()
+
+
+def interpolation_error(table, encoder, X, predict, max_rows=2000, quantile=0.95, seed=42):
+    """How far table answers are from the model on rows of X the table covers.
+
+    Returns the `quantile` of |table - model| / max(|model|, 1) per output
+    and the number of rows compared.
+    """
+    combos, fits = row_combinations(encoder, X)
+    rows = np.flatnonzero(fits)
+    if len(rows) > max_rows:
+        rows = np.sort(np.random.default_rng(seed).choice(rows, max_rows, replace=False))
+    sizes = _column(X, encoder.numeric_index[DataColumn.SIZE.value])
+    prices = _column(X, encoder.numeric_index[DataColumn.PRICE.value])
+    covered, answers = [], []
+    for row in rows:
+        answer = table.lookup(tuple(int(c) for c in combos[row]), float(sizes[row]), float(prices[row]))
+        if answer is not None:
+            covered.append(row)
+            answers.append(answer)
+    if not covered:
+        return np.zeros(table.values.shape[-1]), 0
+    expected = predict(X[covered])
+    relative = np.abs(np.asarray(answers) - expected) / np.maximum(np.abs(expected), 1.0)
+    return np.quantile(relative, quantile, axis=0), len(covered)
+
+
+def all_combinations(encoder):
+    """Full cartesian product of every categorical value seen in training.
+
+    A multi-hot feature contributes every set of up to MULTI_HOT_COMBO_SLOTS values.
+    """
+    groups = []
+    for column, cols in zip(CATEGORICAL_FEATURES, _group_columns(encoder)):
+        slots = _slots(encoder, column)
+        options = [
+            subset + (-1,) * (slots - size)
+            for size in range(1, slots + 1)
+            for subset in itertools.combinations(cols, size)
+        ]
+        groups.append(options or [(-1,) * slots])
+    return np.asarray([sum(parts, ()) for parts in itertools.product(*groups)], dtype=np.int32)
+
+
+def build_prediction_table(model, encoder, combos, size_grid=None, price_grid=None, predict=None):
+    """Score every combination at every Size/Price grid point"""
+    size_grid = np.asarray(size_grid or DEFAULT_SIZE_GRID, dtype=np.float64)
+    price_grid = np.asarray(price_grid or DEFAULT_PRICE_GRID, dtype=np.float64)
+    if len(size_grid) < 2 or len(price_grid) < 2:
+        raise ValueError("Size and price grids need at least two points each")
+    if np.any(np.diff(size_grid) <= 0) or np.any(np.diff(price_grid) <= 0):
+        raise ValueError("Size and price grids must be strictly increasing")
+    predict = predict or model.predict
+
+    size_idx = encoder.numeric_index[DataColumn.SIZE.value]
+    price_idx = encoder.numeric_index[DataColumn.PRICE.value]
+    grid_size, grid_price = np.meshgrid(size_grid, price_grid, indexing='ij')
+    cells = grid_size.size
+
+    values = np.empty((len(combos), len(size_grid), len(price_grid), 3), dtype=np.float32)
+    combos_per_chunk = max(1, BUILD_CHUNK_ROWS // cells)
+    for start in range(0, len(combos), combos_per_chunk):
+        chunk = combos[start:start + combos_per_chunk]
+        X = np.zeros((len(chunk) * cells, encoder.n_features), dtype=np.float32)
+        X[:, size_idx] = np.tile(grid_size.ravel(), len(chunk))
+        X[:, price_idx] = np.tile(grid_price.ravel(), len(chunk))
+        rows = np.arange(len(X))
+        for g in range(chunk.shape[1]):
+            cols = np.repeat(chunk[:, g], cells)
+            known = cols >= 0
+            X[rows[known], cols[known]] = 1.0
+        predictions = predict(X)
+        values[start:start + len(chunk)] = predictions.reshape(len(chunk), len(size_grid), len(price_grid), -1)
+    return values, size_grid, price_grid
+
+
+def save_prediction_table(path, version, combos, size_grid, price_grid, values):
+    """Write the table atomically next to the model artifact"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.npz')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, version=np.asarray(version), combos=combos, size_grid=size_grid,
+                     price_grid=price_grid, values=values)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def load_prediction_table(path, version=None):
+    """Load a table, returning None when it is missing or belongs to another model version"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        table_version = str(data['version'])
+        if version is not None and table_version != version:
+            return None
+        return PredictionTable(table_version, data['combos'], data['size_grid'], data['price_grid'], data['values'])
@@ -1,82 +1,82 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime
-import pika
-import json
 import time
 from .dictionary import QueueName, Action
+from .publisher import get_publisher
+from .consumer import Consumer, consumer_settings
+from .messageCodec import decode
+from .streamingStats import RunningMean, QuantileSketch
+from .columnarStore import ColumnarWriter, artifact_path
+from .rowDelta import RowKeyer
+from .rowBatches import BatchTable, requeue_complete, declare_delay_queue
+from .dbPool import ConnectionPool
+from .dbConfig import create_connection
 import os
+import functools
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 RABBITMQ_HOST = os.environ.get('RABBITMQ_HOST', 'rabbitmq')
+PROCESSOR_CHUNK_ROWS = int(os.environ.get('PROCESSOR_CHUNK_ROWS', 50000))
+# Above this many distinct sizes the fill median comes from an approximate sketch
+SIZE_MEDIAN_EXACT_LIMIT = int(os.environ.get('SIZE_MEDIAN_EXACT_LIMIT', 100000))
+# Processes cleaning row-range shards in parallel, 1 cleans on the consumer thread
+PROCESSOR_WORKERS = int(os.environ.get('PROCESSOR_WORKERS', 1))
+MIN_SHARD_ROWS = int(os.environ.get('PROCESSOR_MIN_SHARD_ROWS', 2000))
+CLEANED_CSV_PATH = './data/cleaned_google_dataset.csv'
+# The typed columnar artifact is what the uploader and trainer read, the CSV is an optional export
+PROCESSOR_CSV_EXPORT = os.environ.get('PROCESSOR_CSV_EXPORT', 'false').lower() in ('1', 'true', 'yes')
+# Every run writes the same cleaned artifact, so concurrent consumer workers take turns
+_output_lock = threading.Lock()
+CLEANED_CATEGORICAL_COLUMNS = ['Category', 'Type', 'Content Rating']
+CLEANED_LIST_COLUMNS = ['Genres']
 
 
 def send_to_uploader(file_path):
     """Send cleaned data file path to uploader via RabbitMQ"""
-    for _ in range(10):
-        try:
-            print("Trying to send message to RabbitMQ...")
-            connection = pika.BlockingConnection(
-                pika.ConnectionParameters(
-                    host=RABBITMQ_HOST,
-                    heartbeat=600,
-                    blocked_connection_timeout=300
-                )
-            )
-            channel = connection.channel()
-            
-            message = {
-                'action': Action.PROCESSOR_UPLOADER_UPLOAD_CLEANED.value,
-                'file_path': file_path,
-                'timestamp': datetime.now().isoformat()
-            }
-            channel.basic_publish(
-                exchange='',
-                routing_key=QueueName.UPLOAD.value,
-                body=json.dumps(message)
-            )
-            
-            print("Cleaned data upload command sent")
-            connection.close()
-        
-        except Exception as e:
-            print(f"Failed to send message to RabbitMQ: {e}")
-            raise
+    message = {
+        'action': Action.PROCESSOR_UPLOADER_UPLOAD_CLEANED.value,
+        'file_path': file_path,
+        'timestamp': datetime.now().isoformat()
+    }
+    get_publisher().publish(QueueName.UPLOAD_BULK.value, message)
+    print("Cleaned data upload command sent")
 
 def send_to_aimodel(file_path):
     """Send cleaned data file path to aimodel via RabbitMQ"""
-    for _ in range(10):
-        try:
-            print("Trying to send message to RabbitMQ for aimodel...")
-            connection = pika.BlockingConnection(
-                pika.ConnectionParameters(
-                    host=RABBITMQ_HOST,
-                    heartbeat=600,
-                    blocked_connection_timeout=300
-                )
-            )
-            
-            channel = connection.channel()
-
-            message = {
-                'action': Action.PROCESSOR_AIMODEL_TRAIN_MODEL.value,
-                'file_path': file_path,
-                'timestamp': datetime.now().isoformat()
-            }
-            channel.basic_publish(
-                exchange='',
-                routing_key=QueueName.AI_MODEL.value,
-                body=json.dumps(message)
-            )
-
-            print("Cleaned data training command sent to aimodel")
-            connection.close()
-
-        except Exception as e:
-            print(f"Failed to send message to RabbitMQ for aimodel: {e}")
-            raise
+    message = {
+        'action': Action.PROCESSOR_AIMODEL_TRAIN_MODEL.value,
+        'file_path': file_path,
+        'timestamp': datetime.now().isoformat()
+    }
+    get_publisher().publish(QueueName.AI_MODEL.value, message)
+    print("Cleaned data training command sent to aimodel")
+
+# Raw batches from a chunked producer wait in this table, shared by every processor, until their dataset is complete
+PROCESSOR_BATCH_TABLE = os.environ.get('PROCESSOR_BATCH_TABLE', 'processor_raw_batches')
+# Connects on first use, so file path messages need no database
+batch_table = BatchTable(
+    ConnectionPool(functools.partial(create_connection, 'PROCESSOR'), minconn=0,
+                   maxconn=int(os.environ.get('PROCESSOR_DB_POOL_MAX', 2))),
+    PROCESSOR_BATCH_TABLE
+)
+
+def process_raw_complete(message):
+    """Clean a chunked dataset once all of its batches have been stored"""
+    dataset_id = message['dataset_id']
+    # Fill statistics cover the whole dataset, so it is cleaned in one piece, in batch order
+    received = batch_table.take(dataset_id, message['batches'], process_data)
+    if received < message['batches']:
+        print(f"Dataset {dataset_id}: {received}/{message['batches']} batches so far")
+        if not requeue_complete(get_publisher(), QueueName.PROCESS.value, message):
+            print(f"Giving up on dataset {dataset_id}, batches are missing")
+            batch_table.discard(dataset_id)
 
 def process_message(ch, method, properties, body):
     """Process received message from RabbitMQ"""
     try:
-        message = json.loads(body)
+        message = decode(body)
         action = message.get('action')
         file_path = message.get('file_path')
 
@@ -84,6 +84,10 @@ def process_message(ch, method, properties, body):
 
         if action == Action.PRODUCER_PROCESSOR_SEND_RAW.value:
             process_data(file_path)
+        elif action == Action.PRODUCER_PROCESSOR_SEND_RAW_BATCH.value:
+            batch_table.add(message)
+        elif action == Action.PRODUCER_PROCESSOR_RAW_COMPLETE.value:
+            process_raw_complete(message)
         else:
             print(f"Unknown action: {action}")
 
@@ -91,6 +95,8 @@ def process_message(ch, method, properties, body):
 
     except Exception as e:
         print(f"Error processing message: {e}")
+        # The consumer requeues or drops the delivery, depending on the error
+        raise
 
 def clean_size(size_str):
     """Convert size string to numeric MB value"""
@@ -119,78 +125,280 @@ def clean_price(price_str):
     except ValueError:
         return 0.0
 
+# Strings float()/int() accept in their common spelling, anything else takes the slow path
+FLOAT_PATTERN = r'\s*[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?\s*'
+INT_PATTERN = r'\s*[+-]?[0-9]+\s*'
+
+
+def _is_text(series):
+    return pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+
+
+def _parse_cell(parse, value, fill):
+    try:
+        return parse(value), False
+    except (ValueError, OverflowError):
+        return fill, True
+
+
+def _parse_column(text, pattern, parse, dtype, fill):
+    """Parse a string column with float()/int() semantics, returning the values and a mask of rejected cells (set to `fill`)"""
+    matches = text.str.fullmatch(pattern).fillna(False).astype(bool)
+    values = pd.Series(np.nan, index=text.index, dtype=object if dtype == 'int64' else 'float64')
+    if matches.any():
+        values[matches] = text[matches].astype(dtype)
+    rest = (text.notna() & ~matches).to_numpy()
+    rejected = np.zeros(len(text), dtype=bool)
+    if rest.any():
+        parsed = [_parse_cell(parse, value, fill) for value in text[rest]]
+        values[rest] = [value for value, _ in parsed]
+        rejected[rest] = [failed for _, failed in parsed]
+    return values, rejected
+
+
+def _on_distinct(series, kernel):
+    """Run a column kernel once per distinct value and broadcast the result, returning it with the count of rejected rows"""
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    values, rejected = kernel(pd.Series(uniques, dtype=series.dtype))
+    cleaned = pd.Series(values.to_numpy().take(codes), index=series.index)
+    return cleaned, int(rejected.take(codes).sum())
+
+
+def _size_kernel(sizes):
+    text = sizes.where(sizes != 'Varies with device')
+    stripped = text.str.replace(r'[Mk,+]', '', regex=True)
+    values, rejected = _parse_column(stripped, FLOAT_PATTERN, float, 'float64', np.nan)
+    # Numbers mixed into an object column are already in MB
+    numbers = stripped.isna() & text.notna()
+    if numbers.any():
+        values[numbers] = pd.to_numeric(text[numbers], errors='coerce')
+    in_kb = text.str.lower().str.contains('k', regex=False).fillna(False).astype(bool).to_numpy()
+    values[in_kb] = values[in_kb] / 1024
+    return values, rejected
+
+
+def _installs_kernel(installs):
+    text = installs.where(installs != 'Free').str.replace(r'[,+]', '', regex=True)
+    values, rejected = _parse_column(text, INT_PATTERN, int, 'int64', 0)
+    return values.fillna(0).astype('int64'), rejected
+
+
+def _price_kernel(prices):
+    text = prices.where(prices != 'Free').str.replace('$', '', regex=False)
+    values, rejected = _parse_column(text, FLOAT_PATTERN, float, 'float64', 0.0)
+    # clean_price treats anything that is not a string as free
+    values[text.isna().to_numpy()] = 0.0
+    return values, rejected
+
+
+def clean_size_column(sizes):
+    """Vectorized clean_size: size strings to MB, NaN for missing or malformed values"""
+    if not _is_text(sizes):
+        return pd.to_numeric(sizes, errors='coerce')
+    values, malformed = _on_distinct(sizes, _size_kernel)
+    if malformed:
+        print(f"Size: {malformed} malformed values set to missing")
+    return values.astype('float64')
+
+
+def clean_installs_column(installs):
+    """Vectorized clean_installs: install strings to int, 0 for missing, 'Free' or malformed values"""
+    if not _is_text(installs):
+        return pd.to_numeric(installs, errors='coerce').fillna(0).astype('int64')
+    values, malformed = _on_distinct(installs, _installs_kernel)
+    if malformed:
+        print(f"Installs: {malformed} malformed values set to 0")
+    return values
+
+
+def clean_price_column(prices):
+    """Vectorized clean_price: price strings to float, 0.0 for missing, 'Free' or malformed values"""
+    if not _is_text(prices):
+        return pd.Series(0.0, index=prices.index)
+    values, _ = _on_distinct(prices, _price_kernel)
+    return values.astype('float64')
+
+
+def clean_rating_column(ratings):
+    """Parse ratings read as text, NaN for missing or malformed values"""
+    if not _is_text(ratings):
+        return pd.to_numeric(ratings, errors='coerce').astype('float64')
+    values, _ = _on_distinct(ratings, lambda text: _parse_column(text, FLOAT_PATTERN, float, 'float64', np.nan))
+    return values.astype('float64')
+
+
+def read_raw_chunks(file_path, chunk_rows=None):
+    """Iterate over the raw CSV in chunks, every column read as text"""
+    # Text columns keep the parsed dtypes identical from one chunk to the next
+    return pd.read_csv(file_path, dtype=str, chunksize=chunk_rows or PROCESSOR_CHUNK_ROWS)
+
+
+def _chunk_fill_stats(chunk):
+    """Partial fill statistics for one chunk, merged by compute_fill_stats"""
+    rating = RunningMean()
+    size = QuantileSketch(max_distinct=SIZE_MEDIAN_EXACT_LIMIT)
+    rating.update(clean_rating_column(chunk['Rating']))
+    size.update(clean_size_column(chunk['Size']))
+    return rating, size, len(chunk)
+
+
+def _ordered_map(executor, fn, args_iter, max_in_flight):
+    """Like executor.map, but results come back in order with a bounded number of pending shards"""
+    pending = deque()
+    for args in args_iter:
+        pending.append(executor.submit(fn, *args))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _map_chunks(fn, args_iter, executor, workers):
+    if executor is None:
+        return (fn(*args) for args in args_iter)
+    return _ordered_map(executor, fn, args_iter, workers * 2)
+
+
+def compute_fill_stats(file_path, chunk_rows=None, executor=None, workers=1):
+    """First streaming pass: the Rating mean and Size median used to fill missing values"""
+    rating = RunningMean()
+    size = QuantileSketch(max_distinct=SIZE_MEDIAN_EXACT_LIMIT)
+    rows = 0
+    chunks = ((chunk,) for chunk in read_raw_chunks(file_path, chunk_rows))
+    for chunk_rating, chunk_size, chunk_rows_seen in _map_chunks(_chunk_fill_stats, chunks, executor, workers):
+        rating.merge(chunk_rating)
+        size.merge(chunk_size)
+        rows += chunk_rows_seen
+    if not size.exact:
+        print(f"Size has more than {SIZE_MEDIAN_EXACT_LIMIT} distinct values, using an approximate median")
+    return {'rows': rows, 'rating_mean': rating.value(), 'size_median': size.median()}
+
+
+def clean_chunk(df, stats):
+    """Clean one chunk of raw rows using dataset-wide fill statistics"""
+    df['Rating'] = clean_rating_column(df['Rating'])
+    df['Reviews'] = pd.to_numeric(df['Reviews'], errors='coerce').astype('float64')
+    df['Size'] = clean_size_column(df['Size'])
+    df['Installs'] = clean_installs_column(df['Installs'])
+    df['Price'] = clean_price_column(df['Price'])
+
+    # Handle missing values
+    df['Rating'] = df['Rating'].fillna(stats['rating_mean'])
+    df['Size'] = df['Size'].fillna(stats['size_median'])
+    df['Reviews'] = df['Reviews'].fillna(0)
+    df['Type'] = df['Type'].fillna('Free')
+
+    # Clean text columns
+    df['Category'] = df['Category'].str.strip()
+    df['Type'] = df['Type'].str.strip()
+    df['Content Rating'] = df['Content Rating'].str.strip()
+
+    df['Last Updated'] = pd.to_datetime(df['Last Updated'], format='mixed', errors='coerce')
+    # Same resolution in every chunk, whether or not it had to fall back to Timestamp.min
+    df['Last Updated'] = df['Last Updated'].fillna(pd.Timestamp.min).astype('datetime64[ns]')
+
+    df['Genres'] = df['Genres'].str.split(';')
+    return df
+
+
+NS_PER_DAY = 24 * 60 * 60 * 10**9
+
+
+def render_csv(df, header):
+    """CSV text of cleaned rows with Last Updated formatted per row, so shard and block layout never change the output"""
+    dates = df['Last Updated']
+    text = dates.dt.strftime('%Y-%m-%d')
+    # clean_chunk stores nanoseconds; Timestamp.min is too close to the bound for dt.normalize
+    timed = dates.to_numpy().astype('int64') % NS_PER_DAY != 0
+    text[timed] = dates[timed].astype(str)
+    return df.assign(**{'Last Updated': text}).to_csv(index=False, header=header)
+
+
+def _clean_shard(chunk, stats, header, as_frame, as_csv):
+    """Clean one row-range shard, returning the frame and/or its CSV text"""
+    df = clean_chunk(chunk, stats)
+    return (
+        df if as_frame else None,
+        render_csv(df, header) if as_csv else None,
+    )
+
+
+def clean_file(file_path, output_path=None, csv_path=None, workers=None, chunk_rows=None):
+    """Clean a raw CSV into a columnar artifact and/or a CSV export over `workers` processes, returning the rows written"""
+    if output_path is None and csv_path is None:
+        raise ValueError("clean_file needs an output_path or a csv_path")
+    workers = workers or PROCESSOR_WORKERS
+    chunk_rows = chunk_rows or PROCESSOR_CHUNK_ROWS
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    writer = None
+    csv_temp_path = csv_path + '.tmp' if csv_path else None
+    try:
+        stats = compute_fill_stats(file_path, chunk_rows, executor, workers)
+        print(f"Fill statistics from {stats['rows']} rows: Rating mean {stats['rating_mean']}, "
+              f"Size median {stats['size_median']}")
+
+        # Second pass: clean shard by shard and append, so memory does not grow with the file
+        shard_rows = chunk_rows
+        if executor is not None:
+            # Small files still get split so every worker has a shard
+            shard_rows = max(MIN_SHARD_ROWS, min(chunk_rows, -(-stats['rows'] // workers)))
+        shards = (
+            (chunk, stats, index == 0, output_path is not None, csv_path is not None)
+            for index, chunk in enumerate(read_raw_chunks(file_path, shard_rows))
+        )
+        if output_path is not None:
+            writer = ColumnarWriter(output_path, CLEANED_CATEGORICAL_COLUMNS, CLEANED_LIST_COLUMNS)
+            keyer = RowKeyer()
+        csv_output = open(csv_temp_path, 'w', newline='') if csv_path else None
+        try:
+            for df, text in _map_chunks(_clean_shard, shards, executor, workers):
+                if writer is not None:
+                    # Keys depend on earlier rows, so they are assigned here in file order
+                    writer.append(keyer.assign(df))
+                if csv_output is not None:
+                    csv_output.write(text)
+        finally:
+            if csv_output is not None:
+                csv_output.close()
+        if writer is not None:
+            writer.close()
+            writer = None
+        if csv_path:
+            os.replace(csv_temp_path, csv_path)
+        return stats['rows']
+    finally:
+        if writer is not None:
+            writer.abort()
+        if csv_temp_path and os.path.exists(csv_temp_path):
+            os.remove(csv_temp_path)
+        if executor is not None:
+            executor.shutdown()
+
 
 def process_data(file_path):
-    """Process the data received from the producer"""
+    """Process the data received from the producer; errors reach the consumer"""
     print(f"Processing data from file: {file_path}")
-    try:
-        df = pd.read_csv(file_path)
-        # Perform data cleaning and processing
-        df['Rating'] = pd.to_numeric(df['Rating'], errors='coerce')
-        df['Reviews'] = pd.to_numeric(df['Reviews'], errors='coerce')
-        df['Size'] = df['Size'].apply(clean_size)
-        df['Installs'] = df['Installs'].apply(clean_installs)
-        df['Price'] = df['Price'].apply(clean_price)
-
-        # Handle missing values
-        df['Rating'] = df['Rating'].fillna(df['Rating'].mean())
-        df['Size'] = df['Size'].fillna(df['Size'].median())
-        df['Reviews'] = df['Reviews'].fillna(0)
-        df['Type'] = df['Type'].fillna('Free')
-
-        # Clean text columns
-        df['Category'] = df['Category'].str.strip()
-        df['Type'] = df['Type'].str.strip()
-        df['Content Rating'] = df['Content Rating'].str.strip()
-
-        df['Last Updated'] = pd.to_datetime(df['Last Updated'], format='mixed', errors='coerce')
-        df['Last Updated'] = df['Last Updated'].fillna(pd.Timestamp.min)
-
-        df['Genres'] = df['Genres'].str.split(';')
-
-        output_path = './data/cleaned_google_dataset.csv'
-        df.to_csv(output_path, index=False)
-        print(f"Cleaned data saved to {output_path}")
+    output_path = artifact_path(CLEANED_CSV_PATH)
+    csv_path = CLEANED_CSV_PATH if PROCESSOR_CSV_EXPORT else None
+    with _output_lock:
+        written = clean_file(file_path, output_path, csv_path)
+        print(f"Cleaned data saved to {output_path} ({written} rows)")
+        if csv_path:
+            print(f"CSV export saved to {csv_path}")
 
         send_to_uploader(output_path)
 
         send_to_aimodel(output_path)
 
-    except Exception as e:
-        print(f"Error processing data: {e}")
-
 def start_listening():
     """Start listening for messages from RabbitMQ"""
-    for _ in range(10):
-        try:
-            print("Starting RabbitMQ listener...")
-            connection = pika.BlockingConnection(
-                pika.ConnectionParameters(
-                    host=RABBITMQ_HOST,
-                    heartbeat=600,
-                    blocked_connection_timeout=300
-                )
-            )
-            
-            channel = connection.channel()
-
-            channel.queue_declare(
-                queue='process_queue',
-                durable=False,
-                auto_delete=False
-            )
-
-            channel.basic_consume(
-                queue=QueueName.PROCESS.value,
-                on_message_callback=process_message
-            )
-
-            print("Waiting for messages...")
-            channel.start_consuming()
-
-        except Exception as e:
-            print(f"Error starting RabbitMQ listener: {e}")
-            raise
+    print("Starting RabbitMQ listener...")
+    Consumer(
+        QueueName.PROCESS.value, process_message, name='processor', host=RABBITMQ_HOST,
+        queue_options={'durable': False, 'auto_delete': False},
+        on_start=functools.partial(declare_delay_queue, queue=QueueName.PROCESS.value),
+        **consumer_settings('PROCESSOR')
+    ).run()
 
 if __name__ == "__main__":
     start_listening()
\ No newline at end of file
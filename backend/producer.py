@@ -1,58 +1,100 @@
 import os
 import json
-import pika
 from datetime import datetime
 import time
-from backend.dictionary import QueueName, Action, DataColumn
+import uuid
+from backend.dictionary import QueueName, Action, DataColumn, Exchange
+from backend.publisher import Publisher
+from backend.rowBatches import iter_csv_batches, batch_message, complete_message
 import argparse
 
 from backend.dictionary import FilePath
 CSV_FILE_PATH = FilePath.DATASET.value
+PRODUCER_CONFIRM_TIMEOUT = float(os.getenv('PRODUCER_CONFIRM_TIMEOUT', 30))
+# Batches published before waiting for confirms, bounds the producer's memory on large files
+PRODUCER_MAX_UNCONFIRMED_BATCHES = int(os.getenv('PRODUCER_MAX_UNCONFIRMED_BATCHES', 20))
 
 def send_data_uploader_processor(file_path):
+    publisher = Publisher(host='localhost')
     try:
         print("Producer connecting to RabbitMQ...")
-        connection = pika.BlockingConnection(
-            pika.ConnectionParameters(host='localhost', heartbeat=600, blocked_connection_timeout=300)
-        )
-        channel = connection.channel()
 
         uploader_message = {
-            Action.PRODUCER_UPLOADER_SEND_RAW.name.lower(): Action.PRODUCER_UPLOADER_SEND_RAW.value,
+            'action': Action.PRODUCER_UPLOADER_SEND_RAW.value,
             DataColumn.FILE_PATH.value: file_path
         }
 
         from backend.dictionary import Exchange
-        channel.basic_publish(
-            exchange=Exchange.ADD_DIRECT.value,
-            routing_key=QueueName.UPLOAD.value,
-            body=json.dumps(uploader_message)
-        )
-        print("File path sent to uploader queue.")
+        publisher.publish(QueueName.UPLOAD_BULK.value, uploader_message, exchange=Exchange.ADD_DIRECT.value)
 
         processor_message = {
-            Action.PRODUCER_PROCESSOR_SEND_RAW.name.lower(): Action.PRODUCER_PROCESSOR_SEND_RAW.value,
+            'action': Action.PRODUCER_PROCESSOR_SEND_RAW.value,
             DataColumn.FILE_PATH.value: file_path
         }
-        channel.basic_publish(
-            exchange=Exchange.ADD_DIRECT.value,
-            routing_key=QueueName.PROCESS.value,
-            body=json.dumps(processor_message)
-        )
-        print("File path sent to processor queue.")
+        publisher.publish(QueueName.PROCESS.value, processor_message, exchange=Exchange.ADD_DIRECT.value)
 
-        connection.close()
+        # Both messages go out on the same connection, wait for the broker to confirm them
+        if not publisher.flush(timeout=PRODUCER_CONFIRM_TIMEOUT):
+            raise TimeoutError(f"RabbitMQ did not confirm the messages within {PRODUCER_CONFIRM_TIMEOUT}s")
+        print("File path sent to uploader queue.")
+        print("File path sent to processor queue.")
     except Exception as e:
         print(f"Failed to send file path to uploader or processor queue: {e}")
         raise
+    finally:
+        publisher.close(timeout=5)
+
+def send_data_chunked(file_path, batch_rows=None):
+    """Stream the dataset itself to the uploader and processor as numbered row batches.
+
+    Consumers do not need to see the producer's filesystem, and batches
+    can be taken by any number of consumer instances. A completion marker
+    with the batch and row counts follows the last batch.
+    """
+    publisher = Publisher(host='localhost')
+    dataset_id = uuid.uuid4().hex
+    routes = [
+        (QueueName.UPLOAD_BULK.value, Action.PRODUCER_UPLOADER_SEND_RAW_BATCH.value, Action.PRODUCER_UPLOADER_RAW_COMPLETE.value),
+        (QueueName.PROCESS.value, Action.PRODUCER_PROCESSOR_SEND_RAW_BATCH.value, Action.PRODUCER_PROCESSOR_RAW_COMPLETE.value),
+    ]
+    try:
+        print(f"Producer streaming {file_path} as dataset {dataset_id}...")
+        batches = 0
+        rows = 0
+        for seq, (columns, text, row_count) in enumerate(iter_csv_batches(file_path, batch_rows)):
+            for queue, batch_action, _ in routes:
+                publisher.publish(queue, batch_message(batch_action, dataset_id, seq, columns, text, row_count),
+                                  exchange=Exchange.ADD_DIRECT.value)
+            batches += 1
+            rows += row_count
+            if batches % PRODUCER_MAX_UNCONFIRMED_BATCHES == 0 and not publisher.flush(timeout=PRODUCER_CONFIRM_TIMEOUT):
+                raise TimeoutError(f"RabbitMQ did not confirm the batches within {PRODUCER_CONFIRM_TIMEOUT}s")
+
+        for queue, _, complete_action in routes:
+            publisher.publish(queue, complete_message(complete_action, dataset_id, batches, rows),
+                              exchange=Exchange.ADD_DIRECT.value)
+        if not publisher.flush(timeout=PRODUCER_CONFIRM_TIMEOUT):
+            raise TimeoutError(f"RabbitMQ did not confirm the messages within {PRODUCER_CONFIRM_TIMEOUT}s")
+        print(f"Sent {rows} rows in {batches} batches to uploader and processor queues.")
+    except Exception as e:
+        print(f"Failed to stream dataset to uploader or processor queue: {e}")
+        raise
+    finally:
+        publisher.close(timeout=5)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Send dataset file path to uploader and processor queues.")
     parser.add_argument('--file', type=str, default=CSV_FILE_PATH, help='Path to the dataset file (default: from FilePath enum)')
+    parser.add_argument('--chunked', action='store_true', default=os.getenv('PRODUCER_CHUNKED', 'false').lower() in ('1', 'true', 'yes'),
+                        help='Send the rows themselves as batch messages instead of the file path')
+    parser.add_argument('--batch-rows', type=int, default=None, help='Rows per batch message in chunked mode')
     args = parser.parse_args()
     file_path = args.file
     if os.path.exists(file_path):
         print(f"Dataset found at {file_path}. Sending to uploader and processor...")
-        send_data_uploader_processor(file_path)
+        if args.chunked:
+            send_data_chunked(file_path, args.batch_rows)
+        else:
+            send_data_uploader_processor(file_path)
     else:
         print(f"Dataset file not found at {file_path}. Please check the file path.")
\ No newline at end of file
@@ -0,0 +1,308 @@
+import os
+import time
+import atexit
+import logging
+import threading
+import itertools
+from collections import deque
+import pika
+from backend.messageCodec import encode
+
+logger = logging.getLogger(__name__)
+
+RABBITMQ_HOST = os.getenv('RABBITMQ_HOST', 'rabbitmq')
+PUBLISHER_CHANNELS = int(os.getenv('PUBLISHER_CHANNELS', 2))
+PUBLISHER_RECONNECT_DELAY = float(os.getenv('PUBLISHER_RECONNECT_DELAY', 5))
+PUBLISHER_MAX_ATTEMPTS = int(os.getenv('PUBLISHER_MAX_ATTEMPTS', 5))
+# Messages held in memory while waiting for the broker or its confirm, 0 means no limit
+PUBLISHER_MAX_PENDING = int(os.getenv('PUBLISHER_MAX_PENDING', 10000))
+# While the queue stays full, one overflow warning is logged per this many dropped messages
+OVERFLOW_LOG_EVERY = 1000
+
+
+class _OutgoingMessage:
+    __slots__ = ('exchange', 'routing_key', 'body', 'properties', 'attempts')
+
+    def __init__(self, exchange, routing_key, body, properties):
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.body = body
+        self.properties = properties
+        self.attempts = 0
+
+
+class _ChannelState:
+    def __init__(self, channel):
+        self.channel = channel
+        self.ready = False
+        self.next_tag = 1
+        self.unconfirmed = {}
+
+
+class Publisher:
+    """Process-wide RabbitMQ publisher with publisher confirms.
+
+    One connection is owned by a background I/O thread running pika's
+    SelectConnection, with a small pool of confirm-mode channels used
+    round robin. `publish` only queues the message and wakes that thread,
+    so callers never wait on connection setup. The broker acks arrive
+    asynchronously (often several at once with `multiple`), and `flush`
+    waits for all of them. Messages that were not confirmed when the
+    connection or a channel went away are published again after the
+    reconnect, and nacked ones are retried up to PUBLISHER_MAX_ATTEMPTS.
+    At most `max_pending` messages are held at once, so a broker outage
+    cannot grow the queue without bound; see `publish`.
+    """
+
+    def __init__(self, host=None, channels=None, reconnect_delay=None, max_pending=None):
+        self.host = host or RABBITMQ_HOST
+        self.channel_count = channels or PUBLISHER_CHANNELS
+        self.reconnect_delay = PUBLISHER_RECONNECT_DELAY if reconnect_delay is None else reconnect_delay
+        self.max_pending = PUBLISHER_MAX_PENDING if max_pending is None else max_pending
+        self._pending = deque()
+        self._condition = threading.Condition()
+        self._connection = None
+        self._channels = []
+        self._round_robin = None
+        self._thread = None
+        self._stopping = False
+        self.published = 0
+        self.confirmed = 0
+        self.nacked = 0
+        self.dropped = 0
+        self.overflowed = 0
+
+    # Caller side
+
+    def start(self):
+        with self._condition:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='rabbitmq-publisher', daemon=True)
+                self._thread.start()
+
+    def publish(self, routing_key, message, exchange='', properties=None, timeout=0.0):
+        """Queue a message for publishing.
+
+        When `max_pending` messages are already queued or unconfirmed, waits
+        up to `timeout` seconds for room and otherwise drops the message.
+        Returns False when the message was dropped.
+        """
+        body = message if isinstance(message, (bytes, str)) else encode(message)
+        self.start()
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self.max_pending and len(self._pending) + self._outstanding() >= self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.overflowed += 1
+                    if self.overflowed % OVERFLOW_LOG_EVERY == 1:
+                        logger.error(f"[PUBLISHER] {self.max_pending} messages waiting on RabbitMQ, dropping "
+                                     f"message for {routing_key} ({self.overflowed} dropped so far)")
+                    return False
+                self._condition.wait(remaining)
+            self._pending.append(_OutgoingMessage(exchange, routing_key, body, properties))
+        self._wake()
+        return True
+
+    def flush(self, timeout=30.0):
+        """Wait until every queued message has been confirmed by the broker"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._pending or self._outstanding():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self, timeout=30.0):
+        self.flush(timeout)
+        with self._condition:
+            self._stopping = True
+            connection = self._connection
+        if connection is not None:
+            try:
+                connection.ioloop.add_callback_threadsafe(self._close_connection)
+            except Exception:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'pending': len(self._pending),
+                'unconfirmed': self._outstanding(),
+                'published': self.published,
+                'confirmed': self.confirmed,
+                'nacked': self.nacked,
+                'dropped': self.dropped,
+                'overflowed': self.overflowed,
+                'connected': self._connection is not None and self._connection.is_open,
+            }
+
+    def _outstanding(self):
+        return sum(len(state.unconfirmed) for state in self._channels)
+
+    def _wake(self):
+        connection = self._connection
+        if connection is not None and connection.is_open:
+            try:
+                connection.ioloop.add_callback_threadsafe(self._drain)
+            except Exception:
+                # Connection went away in between; the reconnect drains the queue
+                pass
+
+    # I/O thread side
+
+    def _run(self):
+        while not self._stopping:
+            params = pika.ConnectionParameters(
+                host=self.host,
+                heartbeat=600,
+                blocked_connection_timeout=300
+            )
+            connection = pika.SelectConnection(
+                params,
+                on_open_callback=self._on_connection_open,
+                on_open_error_callback=self._on_connection_open_error,
+                on_close_callback=self._on_connection_closed
+            )
+            with self._condition:
+                self._connection = connection
+            connection.ioloop.start()
+            with self._condition:
+                self._connection = None
+                self._requeue_unconfirmed(self._channels)
+                self._channels = []
+            if not self._stopping:
+                time.sleep(self.reconnect_delay)
+
+    def _on_connection_open(self, connection):
+        logger.info(f"[PUBLISHER] Connected to RabbitMQ at {self.host}")
+        for _ in range(self.channel_count):
+            self._open_channel(connection)
+
+    def _on_connection_open_error(self, connection, error):
+        logger.error(f"[PUBLISHER] Could not connect to RabbitMQ: {error}")
+        connection.ioloop.stop()
+
+    def _on_connection_closed(self, connection, reason):
+        if not self._stopping:
+            logger.warning(f"[PUBLISHER] Connection closed: {reason}")
+        connection.ioloop.stop()
+
+    def _close_connection(self):
+        if self._connection is not None and self._connection.is_open:
+            self._connection.close()
+
+    def _open_channel(self, connection):
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_channel_open(self, channel):
+        state = _ChannelState(channel)
+        channel.add_on_close_callback(lambda ch, reason: self._on_channel_closed(state, reason))
+        channel.confirm_delivery(
+            ack_nack_callback=lambda frame: self._on_confirm(state, frame),
+            callback=lambda _frame: self._on_channel_ready(state)
+        )
+        with self._condition:
+            self._channels.append(state)
+            self._round_robin = itertools.cycle(list(self._channels))
+
+    def _on_channel_ready(self, state):
+        state.ready = True
+        self._drain()
+
+    def _on_channel_closed(self, state, reason):
+        with self._condition:
+            if state in self._channels:
+                self._channels.remove(state)
+            self._round_robin = itertools.cycle(list(self._channels)) if self._channels else None
+            self._requeue_unconfirmed([state])
+        connection = self._connection
+        if not self._stopping and connection is not None and connection.is_open:
+            logger.warning(f"[PUBLISHER] Channel closed ({reason}), opening a new one")
+            self._open_channel(connection)
+
+    def _requeue_unconfirmed(self, states):
+        """Put messages the broker never confirmed back in front of the queue (lock held)"""
+        for state in states:
+            for tag in sorted(state.unconfirmed, reverse=True):
+                self._retry(state.unconfirmed[tag])
+            state.unconfirmed.clear()
+        self._condition.notify_all()
+
+    def _retry(self, message):
+        if message.attempts >= PUBLISHER_MAX_ATTEMPTS:
+            self.dropped += 1
+            logger.error(f"[PUBLISHER] Dropping message for {message.routing_key} after {message.attempts} attempts")
+        else:
+            self._pending.appendleft(message)
+
+    def _next_ready_channel(self):
+        for _ in range(len(self._channels)):
+            state = next(self._round_robin)
+            if state.ready and state.channel.is_open:
+                return state
+        return None
+
+    def _drain(self):
+        with self._condition:
+            while self._pending and self._round_robin is not None:
+                state = self._next_ready_channel()
+                if state is None:
+                    return
+                message = self._pending.popleft()
+                message.attempts += 1
+                try:
+                    state.channel.basic_publish(
+                        exchange=message.exchange,
+                        routing_key=message.routing_key,
+                        body=message.body,
+                        properties=message.properties
+                    )
+                except Exception as e:
+                    logger.error(f"[PUBLISHER] Publish failed: {e}")
+                    self._pending.appendleft(message)
+                    return
+                state.unconfirmed[state.next_tag] = message
+                state.next_tag += 1
+                self.published += 1
+
+    def _on_confirm(self, state, frame):
+        method = frame.method
+        acked = isinstance(method, pika.spec.Basic.Ack)
+        with self._condition:
+            if method.multiple:
+                tags = [tag for tag in state.unconfirmed if tag <= method.delivery_tag]
+            else:
+                tags = [method.delivery_tag] if method.delivery_tag in state.unconfirmed else []
+            for tag in tags:
+                message = state.unconfirmed.pop(tag)
+                if acked:
+                    self.confirmed += 1
+                else:
+                    self.nacked += 1
+                    self._retry(message)
+            self._condition.notify_all()
+        if not acked:
+            self._drain()
+
+
+_publisher = None
+_publisher_pid = None
+_publisher_lock = threading.Lock()
+
+
+def get_publisher():
+    """Return this process's shared Publisher, creating it on first use"""
+    global _publisher, _publisher_pid
+    with _publisher_lock:
+        # A forked worker must not reuse its parent's connection
+        if _publisher is None or _publisher_pid != os.getpid():
+            _publisher = Publisher()
+            _publisher_pid = os.getpid()
+            atexit.register(_publisher.close, 5.0)
+        return _publisher
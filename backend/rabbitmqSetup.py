@@ -13,6 +13,7 @@ QUEUES = [
     {'name': QueueName.PROCESS.value, 'durable': False, 'auto_delete': False},
     {'name': QueueName.AI_MODEL.value, 'durable': False, 'auto_delete': False},
     {'name': QueueName.UPLOAD.value, 'durable': False, 'auto_delete': False},
+    {'name': QueueName.UPLOAD_BULK.value, 'durable': False, 'auto_delete': False},
 ]
 
 def setup_queues(host):
@@ -0,0 +1,196 @@
+import io
+import os
+import csv
+import tempfile
+import itertools
+import pandas as pd
+
+BATCH_ROWS = int(os.getenv('ROW_BATCH_ROWS', 5000))
+# How often a completion marker that arrived ahead of its batches is put back
+COMPLETE_MAX_ATTEMPTS = int(os.getenv('ROW_BATCH_COMPLETE_MAX_ATTEMPTS', 60))
+COMPLETE_RETRY_DELAY = float(os.getenv('ROW_BATCH_COMPLETE_RETRY_DELAY', 1.0))
+# Batches of a dataset whose completion marker never arrived are dropped after this long
+BATCH_MAX_AGE_HOURS = float(os.getenv('ROW_BATCH_MAX_AGE_HOURS', 24))
+
+
+def iter_csv_batches(file_path, batch_rows=None):
+    """Split a CSV into (columns, csv_text, row_count) batches.
+
+    Records are split with the csv module, so quoted fields containing
+    newlines stay in one row. The text carries no header.
+    """
+    batch_rows = batch_rows or BATCH_ROWS
+    with open(file_path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        columns = next(reader, None)
+        if columns is None:
+            return
+        while True:
+            rows = list(itertools.islice(reader, batch_rows))
+            if not rows:
+                return
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            yield columns, buffer.getvalue(), len(rows)
+
+
+def batch_message(action, dataset_id, seq, columns, text, row_count):
+    return {
+        'action': action,
+        'dataset_id': dataset_id,
+        'seq': seq,
+        'columns': columns,
+        'rows': text,
+        'row_count': row_count,
+    }
+
+
+def complete_message(action, dataset_id, batches, rows, attempt=0):
+    """Marker sent after the last batch, with the counts a consumer needs to know it has everything"""
+    return {
+        'action': action,
+        'dataset_id': dataset_id,
+        'batches': batches,
+        'rows': rows,
+        'attempt': attempt,
+    }
+
+
+def delay_queue(queue):
+    return f"{queue}.delay"
+
+
+def declare_delay_queue(channel, queue):
+    """Declare the queue where requeued markers for `queue` wait out COMPLETE_RETRY_DELAY.
+
+    Nothing consumes it: each message expires after the delay and is
+    dead-lettered through the default exchange back onto `queue`.
+    """
+    channel.queue_declare(
+        queue=delay_queue(queue), durable=False, auto_delete=False,
+        arguments={
+            'x-message-ttl': int(COMPLETE_RETRY_DELAY * 1000),
+            'x-dead-letter-exchange': '',
+            'x-dead-letter-routing-key': queue,
+        }
+    )
+
+
+def requeue_complete(publisher, routing_key, message):
+    """Put back a completion marker whose batches have not all arrived yet.
+
+    The marker goes through the delay queue of `routing_key` (see
+    declare_delay_queue), so the consumer thread is free in the meantime.
+    Returns False once the marker has been put back COMPLETE_MAX_ATTEMPTS
+    times, so a dataset with a lost batch is eventually given up on, or
+    when the marker could not be published.
+    """
+    attempt = message.get('attempt', 0) + 1
+    if attempt >= COMPLETE_MAX_ATTEMPTS:
+        return False
+    return publisher.publish(delay_queue(routing_key), {**message, 'attempt': attempt}, timeout=30.0)
+
+
+def delete_stale_batches(cursor, table):
+    """Drop batches stored more than BATCH_MAX_AGE_HOURS ago, left by datasets that never completed"""
+    cursor.execute(f"DELETE FROM {table} WHERE stored_at < now() - %s * interval '1 hour'", (BATCH_MAX_AGE_HOURS,))
+
+
+def batch_frame(message, dtype=None):
+    """Parse the rows of a batch message the way the whole file would be read"""
+    return pd.read_csv(io.StringIO(message['rows']), header=None, names=message['columns'], dtype=dtype)
+
+
+class BatchTable:
+    """Collects the batches of datasets in a database table shared by every consumer instance.
+
+    Batches can arrive in any order, more than once (redeliveries) and at
+    different instances; each is stored as one row keyed by dataset id and
+    sequence number, so whichever instance holds the completion marker can
+    read them all back in order. Batches of datasets whose marker never
+    came are dropped after BATCH_MAX_AGE_HOURS.
+    """
+
+    def __init__(self, pool, table):
+        self.pool = pool
+        self.table = table
+
+    def _ensure_table(self, cursor):
+        # Instances starting together would race on CREATE TABLE IF NOT EXISTS
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (self.table,))
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "dataset_id TEXT NOT NULL, batch_seq INTEGER NOT NULL, columns TEXT[] NOT NULL, "
+            "rows TEXT NOT NULL, stored_at TIMESTAMPTZ NOT NULL DEFAULT now(), "
+            "PRIMARY KEY (dataset_id, batch_seq))"
+        )
+
+    def add(self, message):
+        """Store one batch; a redelivered batch replaces its earlier copy"""
+        def store(conn):
+            with conn.cursor() as cursor:
+                self._ensure_table(cursor)
+                cursor.execute(
+                    f"INSERT INTO {self.table} (dataset_id, batch_seq, columns, rows) VALUES (%s, %s, %s, %s) "
+                    "ON CONFLICT (dataset_id, batch_seq) DO UPDATE "
+                    "SET columns = EXCLUDED.columns, rows = EXCLUDED.rows, stored_at = now()",
+                    (str(message['dataset_id']), int(message['seq']), list(message['columns']), message['rows'])
+                )
+            conn.commit()
+        self.pool.run(store)
+
+    def take(self, dataset_id, batches, handle):
+        """Call handle(csv_path) on the reassembled dataset once all `batches` are stored.
+
+        The dataset's batches are locked while it runs, so two instances
+        holding markers for the same dataset cannot both handle it, and are
+        deleted only once it returns. When it raises they stay stored for
+        the requeued marker. Returns the number of batches received so far;
+        handle is only called when that reaches `batches`.
+        """
+        dataset_id = str(dataset_id)
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                self._ensure_table(cursor)
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"{self.table}:{dataset_id}",))
+                cursor.execute(f"SELECT count(*) FROM {self.table} WHERE dataset_id = %s", (dataset_id,))
+                received = cursor.fetchone()[0]
+            if received < batches:
+                conn.rollback()
+                return received
+            fd, csv_path = tempfile.mkstemp(prefix=f"{os.path.basename(dataset_id)}-", suffix='.csv')
+            try:
+                with os.fdopen(fd, 'w', newline='', encoding='utf-8') as output:
+                    self._write_dataset(conn, dataset_id, output)
+                handle(csv_path)
+            finally:
+                os.remove(csv_path)
+            with conn.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {self.table} WHERE dataset_id = %s", (dataset_id,))
+                delete_stale_batches(cursor, self.table)
+            conn.commit()
+            return received
+
+    def _write_dataset(self, conn, dataset_id, output):
+        """Write the header and the batches in sequence order as one CSV"""
+        with conn.cursor(name=f"{self.table}_reader") as cursor:
+            cursor.itersize = 1
+            cursor.execute(
+                f"SELECT columns, rows FROM {self.table} WHERE dataset_id = %s ORDER BY batch_seq", (dataset_id,)
+            )
+            header = True
+            for columns, rows in cursor:
+                if header:
+                    csv.writer(output).writerow(columns)
+                    header = False
+                output.write(rows)
+
+    def discard(self, dataset_id):
+        """Drop a dataset's batches, along with any stale ones"""
+        def delete(conn):
+            with conn.cursor() as cursor:
+                self._ensure_table(cursor)
+                cursor.execute(f"DELETE FROM {self.table} WHERE dataset_id = %s", (str(dataset_id),))
+                delete_stale_batches(cursor, self.table)
+            conn.commit()
+        self.pool.run(delete)
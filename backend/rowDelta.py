@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+from pandas.util import hash_pandas_object
+from backend.dictionary import DataColumn
+
+# Columns whose values make up the content hash, in table order
+CONTENT_COLUMNS = [
+    DataColumn.APP.value, DataColumn.CATEGORY.value, DataColumn.RATING.value, DataColumn.REVIEWS.value,
+    DataColumn.SIZE.value, DataColumn.INSTALLS.value, DataColumn.TYPE.value, DataColumn.PRICE.value,
+    DataColumn.CONTENT_RATING.value, DataColumn.GENRES.value, DataColumn.LAST_UPDATED.value,
+    DataColumn.CURRENT_VER.value, DataColumn.ANDROID_VER.value,
+]
+KEY_SEPARATOR = '\x1f'
+
+
+def _hashable(series):
+    """Normalise a column so equal content hashes equally whatever dtype it was read with"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(object)
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if pd.api.types.is_numeric_dtype(series):
+        # 159 read as int in one file and as 159.0 in the next is the same value
+        return series.astype('float64')
+    return series.map(lambda value: str(list(value)) if isinstance(value, (list, tuple, np.ndarray)) else value)
+
+
+def content_hash(df, columns=None):
+    """Stable signed 64-bit hash of each row's content, for a BIGINT column"""
+    columns = columns or CONTENT_COLUMNS
+    normalised = pd.DataFrame({column: _hashable(df[column]) for column in columns})
+    return hash_pandas_object(normalised, index=False).to_numpy().view(np.int64)
+
+
+class RowKeyer:
+    """Assigns row keys and content hashes to the chunks of one dataset in order.
+
+    The key is App + Current Ver plus an occurrence number, since the
+    scrape lists some apps several times with the same version; the n-th
+    such row keeps the same key from one run to the next.
+    """
+
+    def __init__(self, content_columns=None):
+        self.content_columns = content_columns or CONTENT_COLUMNS
+        self._seen = {}
+
+    def row_keys(self, df):
+        base = (
+            df[DataColumn.APP.value].astype(object).fillna('').astype(str)
+            + KEY_SEPARATOR
+            + df[DataColumn.CURRENT_VER.value].astype(object).fillna('').astype(str)
+        )
+        previous = base.map(self._seen).fillna(0).astype('int64')
+        occurrence = previous + base.groupby(base, sort=False).cumcount()
+        for key, count in base.value_counts(sort=False).items():
+            self._seen[key] = self._seen.get(key, 0) + int(count)
+        return base + KEY_SEPARATOR + occurrence.astype(str)
+
+    def assign(self, df):
+        df = df.copy()
+        df[DataColumn.ROW_KEY.value] = self.row_keys(df).to_numpy(dtype=object)
+        df[DataColumn.ROW_HASH.value] = content_hash(df, self.content_columns)
+        return df
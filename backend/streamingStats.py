@@ -0,0 +1,107 @@
+import math
+import numpy as np
+import pandas as pd
+
+
+class RunningMean:
+    """Mean of a column seen one chunk at a time, NaN ignored like Series.mean"""
+
+    def __init__(self):
+        self.total = 0.0
+        self.count = 0
+
+    def update(self, values):
+        values = pd.Series(values, dtype='float64').dropna()
+        self.total += float(values.sum())
+        self.count += len(values)
+
+    def merge(self, other):
+        self.total += other.total
+        self.count += other.count
+
+    def value(self):
+        return self.total / self.count if self.count else float('nan')
+
+
+class QuantileSketch:
+    """Streaming quantiles from value counts with bounded memory.
+
+    Counts are kept per distinct value, which makes the quantiles exact
+    (the median matches Series.median) as long as the column has at most
+    `max_distinct` distinct values. Past that the counts are folded into
+    logarithmic buckets whose representative is within `relative_error`
+    of every value in the bucket, so memory stays bounded at the cost of
+    an approximate answer.
+    """
+
+    def __init__(self, max_distinct=100000, relative_error=0.001):
+        self.max_distinct = max_distinct
+        self.relative_error = relative_error
+        self.gamma = (1 + relative_error) / (1 - relative_error)
+        self.counts = pd.Series(dtype='int64')
+        self.exact = True
+
+    def _bucket(self, values):
+        """Map positive values to the representative of their log bucket"""
+        index = np.ceil(np.log(values) / math.log(self.gamma))
+        return 2 * np.power(self.gamma, index) / (self.gamma + 1)
+
+    def _fold(self, counts):
+        keys = np.array(counts.index, dtype='float64')
+        positive = keys > 0
+        keys[positive] = self._bucket(keys[positive])
+        return counts.groupby(keys).sum()
+
+    def _add_counts(self, counts):
+        if not self.exact:
+            counts = self._fold(counts)
+        self.counts = self.counts.add(counts, fill_value=0).astype('int64')
+        if self.exact and len(self.counts) > self.max_distinct:
+            self.exact = False
+            self.counts = self._fold(self.counts)
+
+    def update(self, values):
+        values = pd.Series(values, dtype='float64').dropna()
+        if len(values):
+            self._add_counts(values.value_counts())
+
+    def merge(self, other):
+        if not other.exact and self.exact:
+            self.exact = False
+            self.counts = self._fold(self.counts)
+        self._add_counts(other.counts)
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def quantile(self, q):
+        """Linearly interpolated quantile, the way Series.quantile computes it"""
+        total = self.count
+        if not total:
+            return float('nan')
+        counts = self.counts.sort_index()
+        keys = counts.index.to_numpy(dtype='float64')
+        cumulative = np.cumsum(counts.to_numpy())
+        position = q * (total - 1)
+        lower = int(math.floor(position))
+        upper = int(math.ceil(position))
+        low_value = keys[np.searchsorted(cumulative, lower, side='right')]
+        high_value = keys[np.searchsorted(cumulative, upper, side='right')]
+        if lower == upper:
+            return float(low_value)
+        return float(low_value + (high_value - low_value) * (position - lower))
+
+    def median(self):
+        total = self.count
+        if not total:
+            return float('nan')
+        if total % 2:
+            return self.quantile(0.5)
+        # Same arithmetic as np.median for an even number of values
+        counts = self.counts.sort_index()
+        keys = counts.index.to_numpy(dtype='float64')
+        cumulative = np.cumsum(counts.to_numpy())
+        low_value = keys[np.searchsorted(cumulative, total // 2 - 1, side='right')]
+        high_value = keys[np.searchsorted(cumulative, total // 2, side='right')]
+        return float(np.mean([low_value, high_value]))
@@ -0,0 +1,33 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def staging_name(table):
+    return f"{table}_staging"
+
+
+def create_staging_table(conn, table, columns):
+    """Create an index-free temporary table with the given columns of a table, dropped at commit"""
+    staging = staging_name(table)
+    with conn.cursor() as cursor:
+        # Concurrent loads of the same table, from other workers or instances, take turns
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (staging,))
+        cursor.execute(
+            f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT {', '.join(columns)} FROM {table} WITH NO DATA"
+        )
+    return staging
+
+
+def replace_from_staging(conn, table, columns):
+    """Replace every row of the live table with the staging rows; readers see the old rows until commit.
+
+    The live table itself is kept, with its grants, row level security
+    policies, triggers, publications and dependent views.
+    """
+    staging = staging_name(table)
+    column_list = ', '.join(columns)
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {staging}")
+        logger.info(f"[SWAP] Replaced {cursor.rowcount} rows of {table}")
@@ -0,0 +1,179 @@
+import os
+import uuid
+import queue
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from .modelBackends import backend_name
+
+logger = logging.getLogger(__name__)
+
+TRAINING_WORKERS = int(os.getenv('TRAINING_WORKERS', 1))
+TRAINING_JOB_HISTORY = int(os.getenv('TRAINING_JOB_HISTORY', 20))
+TRAINING_LOOKUP_TABLE = os.getenv('BUILD_LOOKUP_TABLE', 'false').lower() in ('1', 'true', 'yes')
+
+# Set in each pool process by _init_worker
+_progress_queue = None
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def run_training_job(job_id, data_path, model_path, lookup_table, backend=None):
+    """Pool process entry point: train, validate and publish one model artifact"""
+    from backend.aimodelTrain import fit_and_save
+
+    def progress(stage, fraction):
+        _progress_queue.put((job_id, stage, fraction))
+
+    model_data = fit_and_save(data_path, lookup_table=lookup_table, model_path=model_path, progress=progress,
+                              backend=backend)
+    return {
+        'version': model_data['version'],
+        'backend': model_data['backend'],
+        'trained_at': model_data['trained_at'],
+        'metrics': model_data['metrics'],
+    }
+
+
+class TrainingJobManager:
+    """Runs training jobs in a background process pool for the serving process.
+
+    Training never shares the interpreter with request handling, so the
+    serving path does not pause. A trigger for a dataset that already has
+    a job waiting to start is folded into that job instead of queueing
+    another run. Pool processes report their stage through a queue, and
+    once a job has published its artifact the model registry is asked to
+    pick it up straight away rather than at its next poll.
+    """
+
+    def __init__(self, model_registry=None, model_path=None, workers=None, lookup_table=None, history=None):
+        self.model_registry = model_registry
+        self.model_path = model_path or (model_registry.model_path if model_registry is not None else None)
+        self.workers = workers or TRAINING_WORKERS
+        self.lookup_table = TRAINING_LOOKUP_TABLE if lookup_table is None else lookup_table
+        self.history = history or TRAINING_JOB_HISTORY
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._progress_queue = None
+        self._listener = None
+
+    def start(self):
+        with self._lock:
+            if self._executor is not None:
+                return
+            # spawn keeps the pool free of the Flask and pika threads of this process
+            context = multiprocessing.get_context('spawn')
+            self._progress_queue = context.Queue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=context,
+                initializer=_init_worker, initargs=(self._progress_queue,)
+            )
+            self._listener = threading.Thread(target=self._listen, name='training-progress', daemon=True)
+            self._listener.start()
+
+    def submit(self, data_path, trigger=None, backend=None):
+        """Queue a training run on data_path, or join the one already waiting for it"""
+        backend = backend_name(backend)
+        self.start()
+        with self._lock:
+            for job in self._jobs.values():
+                if job['state'] == 'queued' and job['data_path'] == data_path and job['backend'] == backend:
+                    job['triggers'] += 1
+                    logger.info(f"[TRAINING] Coalesced trigger into queued job {job['id']}")
+                    return dict(job)
+            job = {
+                'id': uuid.uuid4().hex,
+                'data_path': data_path,
+                'backend': backend,
+                'trigger': trigger,
+                'triggers': 1,
+                'state': 'queued',
+                'stage': None,
+                'progress': 0.0,
+                'submitted_at': datetime.now().isoformat(),
+                'started_at': None,
+                'finished_at': None,
+                'result': None,
+                'error': None,
+            }
+            self._jobs[job['id']] = job
+            self._trim()
+            future = self._executor.submit(
+                run_training_job, job['id'], data_path, self.model_path, self.lookup_table, backend
+            )
+        future.add_done_callback(lambda f, job_id=job['id']: self._finish(job_id, f))
+        logger.info(f"[TRAINING] Queued job {job['id']} for {data_path}")
+        return dict(job)
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job['state'] in ('succeeded', 'failed')]
+        for job_id in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job_id]
+
+    def _listen(self):
+        while True:
+            try:
+                job_id, stage, fraction = self._progress_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job['state'] in ('succeeded', 'failed'):
+                    continue
+                if job['state'] == 'queued':
+                    job['state'] = 'running'
+                    job['started_at'] = datetime.now().isoformat()
+                job['stage'] = stage
+                job['progress'] = fraction
+
+    def _finish(self, job_id, future):
+        error = future.exception()
+        if error is None and self.model_registry is not None:
+            # Swapped in before the job reports success, so a finished job means a serving model
+            self.model_registry.reload_if_changed()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job['finished_at'] = datetime.now().isoformat()
+            if error is not None:
+                job['state'] = 'failed'
+                job['error'] = str(error)
+            else:
+                job['state'] = 'succeeded'
+                job['progress'] = 1.0
+                job['stage'] = 'done'
+                job['result'] = future.result()
+        if error is not None:
+            logger.error(f"[TRAINING] Job {job_id} failed: {error}")
+        else:
+            logger.info(f"[TRAINING] Job {job_id} published model version {job['result']['version']}")
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def status(self):
+        with self._lock:
+            jobs = [dict(job) for job in self._jobs.values()]
+        return {
+            'workers': self.workers,
+            'active': [job for job in jobs if job['state'] in ('queued', 'running')],
+            'jobs': list(reversed(jobs)),
+        }
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
@@ -1,288 +1,421 @@
-import psycopg2
+from psycopg2.extras import execute_values
 from dotenv import load_dotenv
 import os
-import json
 import pandas as pd
-import pika
 import time
 import logging
+import functools
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 from backend.dictionary import QueueName, Action, DataColumn, DbColumn, PredictionColumn
+from backend.bulkLoader import bulk_load
+from backend.dbPool import ConnectionPool, CONNECTION_ERRORS
+from backend.dbConfig import create_connection, require_settings, log_settings
+from backend.writeBuffer import WriteBuffer
+from backend.columnarStore import iter_dataset
+from backend.rowDelta import RowKeyer
+from backend.rowBatches import batch_frame, requeue_complete, declare_delay_queue, delete_stale_batches
+from backend.publisher import get_publisher
+from backend.consumer import Consumer, consumer_settings
+from backend.messageCodec import decode
+from backend.tableSwap import create_staging_table, replace_from_staging
 
 load_dotenv()
 
 RABBITMQ_HOST = os.environ.get('RABBITMQ_HOST', 'rabbitmq')
 
-DB_USER = os.environ.get('user')
-DB_PASSWORD = os.environ.get('password')
-DB_HOST = os.environ.get('host')
-DB_PORT = os.environ.get('port', '5432')
-DB_NAME = os.environ.get('dbname')
-
-if not DB_HOST:
-    raise ValueError("host environment variable is not set")
-if not DB_USER:
-    raise ValueError("user environment variable is not set")
-if not DB_PASSWORD:
-    raise ValueError("password environment variable is not set")
-if not DB_NAME:
-    raise ValueError("dbname environment variable is not set")
-
-logger.info(f"host: {DB_HOST}")
-logger.info(f"port: {DB_PORT}")
-logger.info(f"user: {DB_USER}")
-logger.info(f"dbname: {DB_NAME}")
-
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?sslmode=require"
-
-safe_conn_string = DATABASE_URL.replace(DB_PASSWORD, '****')
-logger.info(f"Database connection string: {safe_conn_string}")
-
-def create_connection():
-    """Create and return a new database connection"""
-    max_retries = 5
-    retry_delay = 5
-    
-    for attempt in range(max_retries):
-        try:
-            logger.info(f"[UPLOADER] Attempting to connect to database (attempt {attempt + 1}/{max_retries})...")
-            conn = psycopg2.connect(
-                DATABASE_URL,
-                sslmode='require'
+require_settings()
+log_settings('UPLOADER')
+
+# Column order shared by raw_apps and cleaned_apps
+APP_DB_COLUMNS = [
+    DbColumn.APP.value, DbColumn.CATEGORY.value, DbColumn.RATING.value, DbColumn.REVIEWS.value,
+    DbColumn.SIZE.value, DbColumn.INSTALLS.value, DbColumn.TYPE.value, DbColumn.PRICE.value,
+    DbColumn.CONTENT_RATING.value, DbColumn.GENRES.value, DbColumn.LAST_UPDATED.value,
+    DbColumn.CURRENT_VER.value, DbColumn.ANDROID_VER.value,
+]
+APP_DATA_COLUMNS = [
+    DataColumn.APP.value, DataColumn.CATEGORY.value, DataColumn.RATING.value, DataColumn.REVIEWS.value,
+    DataColumn.SIZE.value, DataColumn.INSTALLS.value, DataColumn.TYPE.value, DataColumn.PRICE.value,
+    DataColumn.CONTENT_RATING.value, DataColumn.GENRES.value, DataColumn.LAST_UPDATED.value,
+    DataColumn.CURRENT_VER.value, DataColumn.ANDROID_VER.value,
+]
+
+db_pool = ConnectionPool(
+    functools.partial(create_connection, 'UPLOADER'),
+    minconn=int(os.environ.get('DB_POOL_MIN', 1)),
+    maxconn=int(os.environ.get('DB_POOL_MAX', 5)),
+    health_check_interval=float(os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30))
+)
+# Dataset loads get their own connections so they never wait on, or hold, prediction writes
+bulk_db_pool = ConnectionPool(
+    functools.partial(create_connection, 'UPLOADER'),
+    minconn=int(os.environ.get('BULK_DB_POOL_MIN', 0)),
+    maxconn=int(os.environ.get('BULK_DB_POOL_MAX', 1)),
+    health_check_interval=float(os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30))
+)
+
+# Rows read from the CSV at a time, so uploads of large files run in bounded memory
+UPLOAD_CHUNK_ROWS = int(os.environ.get('UPLOAD_CHUNK_ROWS', 50000))
+# replace swaps every row for a freshly loaded copy, delta only touches new, changed and vanished rows
+UPLOAD_MODE = os.environ.get('UPLOAD_MODE', 'replace')
+
+DELTA_DB_COLUMNS = [DbColumn.ROW_KEY.value, DbColumn.ROW_HASH.value]
+DELTA_DATA_COLUMNS = [DataColumn.ROW_KEY.value, DataColumn.ROW_HASH.value]
+
+def with_row_keys(chunks):
+    """Add row keys and content hashes to chunks that do not carry them yet"""
+    keyer = RowKeyer(APP_DATA_COLUMNS)
+    for chunk in chunks:
+        if DataColumn.ROW_KEY.value not in chunk.columns:
+            chunk = keyer.assign(chunk)
+        yield chunk
+
+def ensure_delta_columns(cursor, table):
+    """Add the row key/hash columns and the unique key index if the table predates them"""
+    cursor.execute(
+        f"ALTER TABLE {table} "
+        f"ADD COLUMN IF NOT EXISTS {DbColumn.ROW_KEY.value} TEXT, "
+        f"ADD COLUMN IF NOT EXISTS {DbColumn.ROW_HASH.value} BIGINT"
+    )
+    cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {table}_row_key_idx ON {table} ({DbColumn.ROW_KEY.value})")
+
+def apply_delta(conn, table, chunks):
+    """Stage the new rows and upsert/delete only what changed; the caller commits"""
+    staging = f"{table}_delta"
+    columns = APP_DB_COLUMNS + DELTA_DB_COLUMNS
+    column_list = ', '.join(columns)
+    row_key = DbColumn.ROW_KEY.value
+    row_hash = DbColumn.ROW_HASH.value
+    with conn.cursor() as cursor:
+        ensure_delta_columns(cursor, table)
+        cursor.execute(f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT {column_list} FROM {table} WITH NO DATA")
+
+    staged = bulk_load(conn, staging, columns, with_row_keys(chunks), source_columns=APP_DATA_COLUMNS + DELTA_DATA_COLUMNS)
+
+    with conn.cursor() as cursor:
+        cursor.execute(f"CREATE UNIQUE INDEX ON {staging} ({row_key})")
+        cursor.execute(f"ANALYZE {staging}")
+
+        # Rows loaded before delta mode have no key and are replaced as well
+        cursor.execute(
+            f"DELETE FROM {table} t WHERE t.{row_key} IS NULL "
+            f"OR NOT EXISTS (SELECT 1 FROM {staging} d WHERE d.{row_key} = t.{row_key})"
+        )
+        deleted = cursor.rowcount
+
+        assignments = ', '.join(f"{column} = d.{column}" for column in APP_DB_COLUMNS + [row_hash])
+        cursor.execute(
+            f"UPDATE {table} t SET {assignments} FROM {staging} d "
+            f"WHERE t.{row_key} = d.{row_key} AND t.{row_hash} IS DISTINCT FROM d.{row_hash}"
+        )
+        updated = cursor.rowcount
+
+        cursor.execute(
+            f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {staging} d "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.{row_key} = d.{row_key})"
+        )
+        inserted = cursor.rowcount
+
+    return {
+        'inserted': inserted,
+        'updated': updated,
+        'deleted': deleted,
+        'unchanged': staged - inserted - updated,
+    }
+
+def load_file_into_table(file_path, table, mode=None):
+    """Load the rows of a CSV file or columnar artifact into an apps table, replacing its rows or applying a delta"""
+    mode = mode or UPLOAD_MODE
+    # Check if file path is empty
+    if not file_path.strip():
+        logger.info("Received empty file path. Skipping processing.")
+        return
+
+    # Peek at the first chunk, the rest of the file is streamed inside the transaction
+    first_chunk = next(iter(iter_dataset(file_path, UPLOAD_CHUNK_ROWS)), None)
+
+    if first_chunk is None or first_chunk.empty:
+        logger.info("Received file is valid but results in an empty DataFrame. Skipping processing.")
+        return
+
+    result = bulk_db_pool.run(lambda conn: load_chunks(conn, table, iter_dataset(file_path, UPLOAD_CHUNK_ROWS), mode))
+    log_load_result(table, mode, result)
+    return result
+
+def load_chunks(conn, table, chunks, mode):
+    """Replace or delta-update an apps table from DataFrame chunks and commit"""
+    result = load_chunks_uncommitted(conn, table, chunks, mode)
+    conn.commit()
+    return result
+
+def load_chunks_uncommitted(conn, table, chunks, mode):
+    if mode == 'delta':
+        return apply_delta(conn, table, chunks)
+
+    staging = create_staging_table(conn, table, APP_DB_COLUMNS)
+    logger.info(f"Loading {table} into {staging}...")
+    total_rows = bulk_load(conn, staging, APP_DB_COLUMNS, chunks, source_columns=APP_DATA_COLUMNS)
+    replace_from_staging(conn, table, APP_DB_COLUMNS)
+    return total_rows
+
+def log_load_result(table, mode, result):
+    if mode == 'delta':
+        logger.info(
+            f"[UPLOADER] {table} delta: {result['inserted']} inserted, {result['updated']} updated, "
+            f"{result['deleted']} deleted, {result['unchanged']} unchanged"
+        )
+    else:
+        logger.info(f"Uploaded {result} rows in total.")
+
+# Row batches from a chunked producer are parked here, tagged with their dataset and position
+BATCH_DB_COLUMNS = ['dataset_id', 'batch_seq', 'batch_row']
+
+def batch_table(table):
+    return f"{table}_batches"
+
+def ensure_batch_table(cursor, table):
+    """Create the table that collects the row batches of an apps table, shared by all uploader instances"""
+    batches = batch_table(table)
+    # Two instances creating it at once would collide on the catalog
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (batches,))
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {batches} AS SELECT {', '.join(APP_DB_COLUMNS)} FROM {table} WITH NO DATA"
+    )
+    cursor.execute(
+        f"ALTER TABLE {batches} ADD COLUMN IF NOT EXISTS dataset_id TEXT, "
+        f"ADD COLUMN IF NOT EXISTS batch_seq INTEGER, ADD COLUMN IF NOT EXISTS batch_row INTEGER, "
+        f"ADD COLUMN IF NOT EXISTS stored_at TIMESTAMPTZ NOT NULL DEFAULT now()"
+    )
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {batches}_dataset_idx ON {batches} (dataset_id, batch_seq)")
+
+def store_batch(table, message):
+    """Park one row batch in the batch table; a redelivered batch replaces its earlier copy"""
+    df = batch_frame(message)
+    df['dataset_id'] = message['dataset_id']
+    df['batch_seq'] = int(message['seq'])
+    df['batch_row'] = range(len(df))
+
+    def store(conn):
+        with conn.cursor() as cursor:
+            ensure_batch_table(cursor, table)
+            cursor.execute(
+                f"DELETE FROM {batch_table(table)} WHERE dataset_id = %s AND batch_seq = %s",
+                (message['dataset_id'], int(message['seq']))
             )
-            conn.autocommit = False
-            logger.info("[UPLOADER] Successfully connected to database")
-            return conn
-        except Exception as e:
-            logger.error(f"[UPLOADER] Database connection failed (attempt {attempt + 1}/{max_retries}): {str(e)}")
-            if attempt < max_retries - 1:
-                logger.info(f"[UPLOADER] Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-            else:
-                logger.error("[UPLOADER] Max retries reached. Could not connect to database.")
-                raise
+        rows = bulk_load(conn, batch_table(table), APP_DB_COLUMNS + BATCH_DB_COLUMNS, df,
+                         source_columns=APP_DATA_COLUMNS + BATCH_DB_COLUMNS)
+        conn.commit()
+        return rows
+
+    return bulk_db_pool.run(store)
+
+def iter_batch_rows(conn, table, dataset_id, chunk_rows=None):
+    """Read a dataset back out of the batch table in producer order, as DataFrame chunks"""
+    with conn.cursor(name=f"{batch_table(table)}_reader") as cursor:
+        cursor.itersize = chunk_rows or UPLOAD_CHUNK_ROWS
+        cursor.execute(
+            f"SELECT {', '.join(APP_DB_COLUMNS)} FROM {batch_table(table)} "
+            f"WHERE dataset_id = %s ORDER BY batch_seq, batch_row",
+            (dataset_id,)
+        )
+        while True:
+            rows = cursor.fetchmany(cursor.itersize)
+            if not rows:
+                return
+            yield pd.DataFrame.from_records(rows, columns=APP_DATA_COLUMNS)
+
+def discard_batches(table, dataset_id, conn):
+    """Delete a dataset's stored batches, along with any stale ones"""
+    with conn.cursor() as cursor:
+        ensure_batch_table(cursor, table)
+        cursor.execute(f"DELETE FROM {batch_table(table)} WHERE dataset_id = %s", (dataset_id,))
+        delete_stale_batches(cursor, batch_table(table))
+    conn.commit()
+
+def complete_batches(table, message, routing_key, mode=None):
+    """Load a chunked dataset into its table once every batch is stored, otherwise requeue the marker and return None"""
+    mode = mode or UPLOAD_MODE
+    dataset_id = message['dataset_id']
+    if not message['rows']:
+        logger.info(f"[UPLOADER] Dataset {dataset_id} has no rows. Skipping processing.")
+        return None
+
+    def load(conn):
+        with conn.cursor() as cursor:
+            ensure_batch_table(cursor, table)
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"{table}:{dataset_id}",))
+            cursor.execute(
+                f"SELECT count(DISTINCT batch_seq) FROM {batch_table(table)} WHERE dataset_id = %s",
+                (dataset_id,)
+            )
+            received = cursor.fetchone()[0]
+        if received < message['batches']:
+            conn.rollback()
+            return received, None
+        result = load_chunks_uncommitted(conn, table, iter_batch_rows(conn, table, dataset_id), mode)
+        with conn.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {batch_table(table)} WHERE dataset_id = %s", (dataset_id,))
+            delete_stale_batches(cursor, batch_table(table))
+        conn.commit()
+        return received, result
+
+    received, result = bulk_db_pool.run(load)
+    if result is None:
+        logger.info(f"[UPLOADER] {table} dataset {dataset_id}: {received}/{message['batches']} batches so far")
+        if not requeue_complete(get_publisher(), routing_key, message):
+            logger.error(f"[UPLOADER] Giving up on {table} dataset {dataset_id}, batches are missing")
+            bulk_db_pool.run(functools.partial(discard_batches, table, dataset_id))
+        return None
+    log_load_result(table, mode, result)
+    return result
 
 def upload_raw_data(file_path):
     """Upload raw data to the database based on the file path"""
     logger.info("Starting raw data upload...")
     try:
-        # Debug: Print the file path
         logger.info(f"Received file path: {file_path}")
-
-        # Check if file path is empty
-        if not file_path.strip():
-            logger.info("Received empty file path. Skipping processing.")
-            return
-
-        # Read CSV file into DataFrame
-        df = pd.read_csv(file_path)
-
-        if df.empty:
-            logger.info("Received file is valid but results in an empty DataFrame. Skipping processing.")
-            return
-
-        # Upload raw data to the database
-        conn = create_connection()
-        cursor = conn.cursor()
-
-        # Clear existing data
-        logger.info("Clearing existing data...")
-        cursor.execute("TRUNCATE TABLE raw_apps RESTART IDENTITY")
-        conn.commit()
-
-        # Prepare insert query
-        insert_query = """
-            INSERT INTO raw_apps (
-                app, category, rating, reviews, size, installs, type,
-                price, content_rating, genres, last_updated,
-                current_ver, android_ver
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-
-        # Insert data into the database
-        total_rows = 0
-        for index, row in df.iterrows():
-            prepared_row = (
-                row[DataColumn.APP.value],
-                row[DataColumn.CATEGORY.value],
-                row[DataColumn.RATING.value],
-                row[DataColumn.REVIEWS.value],
-                row[DataColumn.SIZE.value],
-                row[DataColumn.INSTALLS.value],
-                row[DataColumn.TYPE.value],
-                row[DataColumn.PRICE.value],
-                row[DataColumn.CONTENT_RATING.value],
-                row[DataColumn.GENRES.value],
-                row[DataColumn.LAST_UPDATED.value],
-                row[DataColumn.CURRENT_VER.value],
-                row[DataColumn.ANDROID_VER.value]
-            )
-            cursor.execute(insert_query, prepared_row)
-            total_rows += 1
-            if total_rows % 1000 == 0:
-                conn.commit()
-                logger.info(f"Uploaded {total_rows} rows so far...")
-
-        conn.commit()
-        logger.info(f"Uploaded {total_rows} rows in total.")
+        load_file_into_table(file_path, 'raw_apps')
         logger.info("Raw data uploaded successfully.")
 
     except pd.errors.EmptyDataError:
         logger.error("Pandas encountered an EmptyDataError. The file might be invalid or empty.")
     except Exception as e:
         logger.error(f"Error uploading raw data: {e}")
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
-            conn.close()
 
 def upload_cleaned_data(file_path):
     """Upload cleaned data to the database based on the file path"""
     logger.info("Starting cleaned data upload...")
     try:
-        # Debug: Print the file path
         logger.info(f"Received file path: {file_path}")
-
-        # Check if file path is empty
-        if not file_path.strip():
-            logger.info("Received empty file path. Skipping processing.")
-            return
-
-        # Read CSV file into DataFrame
-        df = pd.read_csv(file_path)
-
-        if df.empty:
-            logger.info("Received file is valid but results in an empty DataFrame. Skipping processing.")
-            return
-
-        # Upload cleaned data to the database
-        conn = create_connection()
-        cursor = conn.cursor()
-
-        # Clear existing data
-        logger.info("Clearing existing data from cleaned_apps table...")
-        cursor.execute("TRUNCATE TABLE cleaned_apps RESTART IDENTITY")
-        conn.commit()
-
-        # Prepare insert query
-        insert_query = """
-            INSERT INTO cleaned_apps (
-                app, category, rating, reviews, size, installs, type,
-                price, content_rating, genres, last_updated,
-                current_ver, android_ver
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-
-        # Insert data into the database
-        total_rows = 0
-        for _, row in df.iterrows():
-            prepared_row = (
-                row[DataColumn.APP.value],
-                row[DataColumn.CATEGORY.value],
-                row[DataColumn.RATING.value],
-                row[DataColumn.REVIEWS.value],
-                row[DataColumn.SIZE.value],
-                row[DataColumn.INSTALLS.value],
-                row[DataColumn.TYPE.value],
-                row[DataColumn.PRICE.value],
-                row[DataColumn.CONTENT_RATING.value],
-                row[DataColumn.GENRES.value],
-                row[DataColumn.LAST_UPDATED.value],
-                row[DataColumn.CURRENT_VER.value],
-                row[DataColumn.ANDROID_VER.value]
-            )
-            cursor.execute(insert_query, prepared_row)
-            total_rows += 1
-            if total_rows % 1000 == 0:
-                conn.commit()
-                logger.info(f"Uploaded {total_rows} rows so far...")
-
-        conn.commit()
-        logger.info(f"Uploaded {total_rows} rows in total.")
+        load_file_into_table(file_path, 'cleaned_apps')
         logger.info("Cleaned data uploaded successfully.")
 
     except pd.errors.EmptyDataError:
         logger.error("Pandas encountered an EmptyDataError. The file might be invalid or empty.")
     except Exception as e:
         logger.error(f"Error uploading cleaned data: {e}")
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
-            conn.close()
-
-def upload_prediction(prediction_data):
-    """Upload prediction to the prediction_history table"""
-    logger.info("[UPLOADER] Starting prediction upload...")
-    try:
-        # Upload prediction to the database
-        conn = create_connection()
-        cursor = conn.cursor()
-
-        # Prepare insert query
-        insert_query = """
-            INSERT INTO prediction_history (
-                category, size, type, price, content_rating, genres,
-                predicted_rating, predicted_installs, predicted_reviews,
-                created_at
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
-        """
-
-        # Extract data from prediction
-        input_features = prediction_data['Input Features']
-        predictions = prediction_data['Predictions']
-        
-        logger.info(f"[UPLOADER] Input Features: {input_features}")
-        logger.info(f"[UPLOADER] Predictions: {predictions}")
-        
-        prepared_row = (
-            input_features[PredictionColumn.CATEGORY.value],
-            input_features[PredictionColumn.SIZE.value],
-            input_features[PredictionColumn.TYPE.value],
-            input_features[PredictionColumn.PRICE.value],
-            input_features[PredictionColumn.CONTENT_RATING.value],
-            input_features[PredictionColumn.GENRES.value],
-            predictions[PredictionColumn.RATING.value],
-            predictions[PredictionColumn.INSTALLS.value],
-            predictions[PredictionColumn.REVIEWS.value]
-        )
 
-        # Insert data
-        cursor.execute(insert_query, prepared_row)
+def upload_raw_batch(message):
+    """Store one raw row batch from a chunked producer; errors reach the consumer so the batch is not lost"""
+    rows = store_batch('raw_apps', message)
+    logger.info(f"[UPLOADER] Stored batch {message['seq']} of dataset {message['dataset_id']} ({rows} rows)")
+
+def complete_raw_batches(message):
+    """Load a chunked raw dataset once all its batches are in; errors reach the consumer"""
+    if complete_batches('raw_apps', message, QueueName.UPLOAD_BULK.value) is not None:
+        logger.info("Raw data uploaded successfully.")
+
+def prepare_prediction_row(prediction_data):
+    """Flatten a prediction message into a prediction_history row"""
+    input_features = prediction_data['Input Features']
+    predictions = prediction_data['Predictions']
+    return (
+        input_features[PredictionColumn.CATEGORY.value],
+        input_features[PredictionColumn.SIZE.value],
+        input_features[PredictionColumn.TYPE.value],
+        input_features[PredictionColumn.PRICE.value],
+        input_features[PredictionColumn.CONTENT_RATING.value],
+        input_features[PredictionColumn.GENRES.value],
+        predictions[PredictionColumn.RATING.value],
+        predictions[PredictionColumn.INSTALLS.value],
+        predictions[PredictionColumn.REVIEWS.value]
+    )
+
+def insert_prediction_rows(rows):
+    """Write prepared prediction_history rows with one multi-row insert and one commit"""
+    insert_query = """
+        INSERT INTO prediction_history (
+            category, size, type, price, content_rating, genres,
+            predicted_rating, predicted_installs, predicted_reviews,
+            created_at
+        ) VALUES %s
+    """
+
+    def insert(conn):
+        with conn.cursor() as cursor:
+            execute_values(
+                cursor, insert_query, rows,
+                template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())",
+                page_size=1000
+            )
         conn.commit()
-        logger.info("[UPLOADER] Prediction uploaded successfully")
 
-    except Exception as e:
-        logger.error(f"[UPLOADER] Error uploading prediction: {str(e)}")
-        if 'conn' in locals():
-            conn.rollback()
-        raise
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
-            conn.close()
+    db_pool.run(insert)
+    logger.info(f"[UPLOADER] Uploaded {len(rows)} predictions successfully")
+
+# Prediction messages are written in batches and only acked once their batch is committed
+prediction_buffer = WriteBuffer(
+    insert_prediction_rows,
+    max_rows=int(os.environ.get('PREDICTION_FLUSH_ROWS', 100)),
+    max_delay_ms=float(os.environ.get('PREDICTION_FLUSH_MS', 200)),
+    # Without a database, writing the batch message by message fails the same way
+    split_on=lambda error: not isinstance(error, CONNECTION_ERRORS)
+)
+
+def settle_failed_prediction(ch, method, rows, error):
+    """Requeue a prediction message the database could not be reached for, drop one it rejected"""
+    if isinstance(error, CONNECTION_ERRORS):
+        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+        return
+    logger.error(f"[UPLOADER] Dropping prediction message the database rejected ({error}): {rows}")
+    ch.basic_reject(delivery_tag=method.delivery_tag, requeue=False)
+
+def buffer_predictions(ch, method, predictions):
+    """Queue the rows of a prediction message for the next batched insert"""
+    rows = [prepare_prediction_row(prediction_data) for prediction_data in predictions]
+    prediction_buffer.add(
+        rows,
+        # ch is a ThreadsafeChannel, so the flusher thread can ack through it
+        on_success=functools.partial(ch.basic_ack, delivery_tag=method.delivery_tag),
+        on_failure=functools.partial(settle_failed_prediction, ch, method, rows)
+    )
+
+BULK_ACTIONS = {
+    Action.PRODUCER_UPLOADER_SEND_RAW.value,
+    Action.PRODUCER_UPLOADER_SEND_RAW_BATCH.value,
+    Action.PRODUCER_UPLOADER_RAW_COMPLETE.value,
+    Action.PROCESSOR_UPLOADER_UPLOAD_CLEANED.value,
+}
+
+def forward_to_bulk_lane(body):
+    """Move a dataset load that arrived on the prediction queue over to the bulk queue"""
+    if not get_publisher().publish(QueueName.UPLOAD_BULK.value, body, timeout=30.0):
+        raise TimeoutError("RabbitMQ publish queue is full, could not forward the bulk message")
+    if not get_publisher().flush(timeout=30.0):
+        raise TimeoutError("RabbitMQ did not confirm the forwarded bulk message")
 
 def process_message(ch, method, properties, body):
     """Process received message from RabbitMQ"""
     try:
-        message = json.loads(body)
+        message = decode(body)
         action = message.get('action')
         
         logger.info(f"[UPLOADER] Received message - Action: {action}")
 
-        if action == Action.PRODUCER_UPLOADER_SEND_RAW.value:
+        if action in BULK_ACTIONS and method.routing_key != QueueName.UPLOAD_BULK.value:
+            # Senders from before the bulk queue existed still publish loads here
+            forward_to_bulk_lane(body)
+            logger.info(f"[UPLOADER] Forwarded {action} to {QueueName.UPLOAD_BULK.value}")
+        elif action == Action.PRODUCER_UPLOADER_SEND_RAW.value:
             file_path = message.get(DataColumn.FILE_PATH.value if hasattr(DataColumn, 'FILE_PATH') else 'file_path')
             upload_raw_data(file_path)
+        elif action == Action.PRODUCER_UPLOADER_SEND_RAW_BATCH.value:
+            upload_raw_batch(message)
+        elif action == Action.PRODUCER_UPLOADER_RAW_COMPLETE.value:
+            complete_raw_batches(message)
         elif action == Action.PROCESSOR_UPLOADER_UPLOAD_CLEANED.value:
             file_path = message.get(DataColumn.FILE_PATH.value if hasattr(DataColumn, 'FILE_PATH') else 'file_path')
             upload_cleaned_data(file_path)
         elif action == Action.AIMODEL_UPLOADER_UPLOAD_PREDICTION.value:
             prediction_data = message.get(PredictionColumn.PREDICTION_DATA.value if hasattr(PredictionColumn, 'PREDICTION_DATA') else 'prediction_data')
-            upload_prediction(prediction_data)
+            # Acked by the write buffer after the batch commits
+            buffer_predictions(ch, method, [prediction_data])
+            return
+        elif action == Action.AIMODEL_UPLOADER_UPLOAD_PREDICTION_BATCH.value:
+            buffer_predictions(ch, method, message.get('predictions', []))
+            return
         else:
             logger.info(f"[UPLOADER] Unknown action: {action}")
 
@@ -293,60 +426,59 @@ def process_message(ch, method, properties, body):
     except Exception as e:
         logger.error(f"[UPLOADER] Error processing message: {e}")
         logger.error(f"[UPLOADER] Message content: {body}")
+        # The consumer requeues or drops the delivery, depending on the error
+        raise
+
+def flush_predictions(connection):
+    """Commit buffered predictions and send their acks before the lane's connection closes"""
+    prediction_buffer.close()
+    connection.process_data_events(time_limit=0)
+
+def build_lanes():
+    """One consumer per upload queue, each with its own thread and RabbitMQ connection"""
+    return [
+        Consumer(
+            QueueName.UPLOAD.value, process_message, name='prediction', host=RABBITMQ_HOST,
+            # Enough unacked deliveries in flight for the write buffer to fill a batch
+            **consumer_settings('PREDICTION', prefetch=prediction_buffer.max_rows),
+            on_stop=flush_predictions
+        ),
+        # One load at a time, the next file waits in the queue rather than in this process
+        Consumer(
+            QueueName.UPLOAD_BULK.value, process_message, name='bulk', host=RABBITMQ_HOST,
+            # Completion markers that arrive ahead of their batches wait in its delay queue
+            on_start=functools.partial(declare_delay_queue, queue=QueueName.UPLOAD_BULK.value),
+            **consumer_settings('UPLOAD_BULK')
+        ),
+    ]
 
 def start_listening():
-    """Start listening for messages from RabbitMQ"""
-    connection = None
-    max_retries = 5
-    retry_delay = 5
-    
-    for attempt in range(max_retries):
-        try:
-            logger.info(f"[UPLOADER] Attempting to connect to RabbitMQ (attempt {attempt + 1}/{max_retries})...")
-            # Create connection
-            connection = pika.BlockingConnection(
-                pika.ConnectionParameters(
-                    host=RABBITMQ_HOST,
-                    heartbeat=600,
-                    blocked_connection_timeout=300
-                )
-            )
-            channel = connection.channel()
-            
-            # Declare queue
-            channel.queue_declare(queue=QueueName.UPLOAD.value)
-            logger.info("[UPLOADER] Successfully connected to RabbitMQ")
-            logger.info("[UPLOADER] Service is listening for messages...")
-            
-            # Set up consumer
-            channel.basic_consume(
-                queue=QueueName.UPLOAD.value,
-                on_message_callback=process_message
-            )
-            
-            try:
-                channel.start_consuming()
-            except KeyboardInterrupt:
-                logger.info("\n[UPLOADER] Gracefully shutting down the uploader service...")
-                channel.stop_consuming()
-            return
-            
-        except Exception as e:
-            logger.error(f"[UPLOADER] Error in RabbitMQ connection (attempt {attempt + 1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                logger.info(f"[UPLOADER] Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-            else:
-                logger.error("[UPLOADER] Max retries reached. Could not connect to RabbitMQ.")
-                raise
-        finally:
-            if connection and not connection.is_closed:
-                connection.close()
-                logger.info("[UPLOADER] Connection closed")
+    """Start the prediction and bulk lanes and wait until they stop"""
+    lanes = build_lanes()
+    for lane in lanes:
+        lane.start()
+    logger.info("[UPLOADER] Service is listening for messages...")
+    try:
+        while all(lane.is_alive() for lane in lanes):
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        logger.info("\n[UPLOADER] Gracefully shutting down the uploader service...")
+    finally:
+        for lane in lanes:
+            lane.stop()
+        for lane in lanes:
+            lane.join()
+    # A lane that gave up takes the service down so it gets restarted
+    for lane in lanes:
+        if lane.error is not None:
+            raise lane.error
 
 if __name__ == "__main__":
     logger.info("[UPLOADER] Starting uploader service...")
     try:
         start_listening()
     except KeyboardInterrupt:
-        logger.info("\n[UPLOADER] Uploader service stopped")
\ No newline at end of file
+        logger.info("\n[UPLOADER] Uploader service stopped")
+    finally:
+        db_pool.closeall()
+        bulk_db_pool.closeall()
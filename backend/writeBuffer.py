@@ -0,0 +1,135 @@
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _BufferedMessage:
+    __slots__ = ('rows', 'on_success', 'on_failure')
+
+    def __init__(self, rows, on_success, on_failure):
+        self.rows = rows
+        self.on_success = on_success
+        self.on_failure = on_failure
+
+
+class WriteBuffer:
+    """Accumulates rows from many messages and writes them in one go.
+
+    A background thread calls `flush_fn(rows)` once `max_rows` rows are
+    buffered or the oldest row has waited `max_delay_ms`. Only after
+    `flush_fn` returns are the messages' `on_success` callbacks run (this is
+    where RabbitMQ deliveries get acked). If a batch fails, its messages are
+    written again one at a time, so one bad message cannot hold back the
+    rest: each that commits gets `on_success`, each that fails gets
+    `on_failure(error)`. `split_on(error)` may return False for errors a
+    retry cannot get past (a lost connection), which fail the whole batch.
+    """
+
+    def __init__(self, flush_fn, max_rows=100, max_delay_ms=200, split_on=None):
+        self.flush_fn = flush_fn
+        self.split_on = split_on
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000.0
+        self._messages = []
+        self._row_count = 0
+        self._oldest = None
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._stopped = False
+        self._worker = None
+        self.flushes = 0
+        self.rows_written = 0
+
+    def start(self):
+        with self._condition:
+            if self._worker is None or not self._worker.is_alive():
+                self._stopped = False
+                self._worker = threading.Thread(target=self._run, name='write-buffer-flusher', daemon=True)
+                self._worker.start()
+
+    def add(self, rows, on_success, on_failure):
+        """Buffer the rows of one message together with its ack/nack callbacks"""
+        self.start()
+        with self._condition:
+            self._messages.append(_BufferedMessage(rows, on_success, on_failure))
+            self._row_count += len(rows)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if self._row_count >= self.max_rows:
+                self._condition.notify()
+
+    def _take(self):
+        messages, self._messages = self._messages, []
+        self._row_count = 0
+        self._oldest = None
+        return messages
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    if self._row_count >= self.max_rows:
+                        break
+                    if self._oldest is not None:
+                        remaining = self._oldest + self.max_delay - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+                    else:
+                        self._condition.wait()
+                if self._stopped:
+                    return
+                messages = self._take()
+            self._write(messages)
+
+    def _write(self, messages):
+        if not messages:
+            return
+        with self._flush_lock:
+            rows = [row for message in messages for row in message.rows]
+            try:
+                self.flush_fn(rows)
+            except Exception as e:
+                logger.error(f"[WRITE BUFFER] Flush of {len(rows)} rows failed: {e}")
+                if len(messages) > 1 and (self.split_on is None or self.split_on(e)):
+                    self._write_each(messages)
+                else:
+                    for message in messages:
+                        message.on_failure(e)
+                return
+            self.flushes += 1
+            self.rows_written += len(rows)
+            for message in messages:
+                message.on_success()
+
+    def _write_each(self, messages):
+        """Write a failed batch message by message, isolating the ones that cannot be written"""
+        failed = 0
+        for message in messages:
+            try:
+                self.flush_fn(message.rows)
+            except Exception as e:
+                failed += 1
+                message.on_failure(e)
+                continue
+            self.flushes += 1
+            self.rows_written += len(message.rows)
+            message.on_success()
+        logger.info(f"[WRITE BUFFER] Wrote {len(messages) - failed} of {len(messages)} messages one at a time")
+
+    def flush(self):
+        """Write whatever is buffered right now on the calling thread"""
+        with self._condition:
+            messages = self._take()
+        self._write(messages)
+
+    def close(self):
+        """Stop the flusher thread and write the remaining rows"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._worker is not None:
+            self._worker.join()
+        self.flush()